@@ -2,11 +2,1708 @@ import tkinter as tk
 from tkinter import filedialog, ttk, messagebox, colorchooser, simpledialog
 import pandas as pd
 import qrcode
-from PIL import Image, ImageTk, ImageDraw, ImageFont
+from qrcode import util as qr_util
+from qrcode.base import rs_blocks
+from PIL import Image, ImageTk, ImageDraw, ImageFont, ImageChops, ImageColor
 import os
+import sys
 import threading
 from datetime import datetime
 import json
+import argparse
+import io
+import time
+import zipfile
+import zlib
+import socket
+import csv
+import hashlib
+import re
+import queue
+import gc
+from contextlib import contextmanager
+from collections import OrderedDict, deque, namedtuple
+import itertools
+import shutil
+import sqlite3
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qsl
+from xml.sax.saxutils import escape, quoteattr
+
+CONFIG_FILE = "label_config.json"
+DEFAULT_FONT_FILE = "msyh.ttc"
+
+# 字体文件无法加载时，SVG中按文件名对应的字体族名称引用字体
+FONT_FAMILIES = {
+    "msyh.ttc": "Microsoft YaHei",
+    "simhei.ttf": "SimHei",
+    "simsun.ttc": "SimSun",
+}
+
+# 热敏打印输出格式及对应的文件扩展名
+THERMAL_FORMATS = {
+    "zpl": ".zpl",
+    "zpl-native": ".zpl",
+    "epl": ".epl",
+    "escpos": ".bin",
+}
+
+# SVG输出格式：svg 每个标签一个文件，svg-sheet 所有标签拼在一个文档中
+SVG_FORMATS = {
+    "svg": ".svg",
+    "svg-sheet": ".svg",
+}
+
+# 决定标签外观的配置项，用于计算布局版本
+LAYOUT_KEYS = (
+    'label_width', 'label_height', 'qr_size', 'bg_color', 'text_color', 'qr_color',
+    'field_order', 'field_display_types', 'field_prefixes', 'field_suffixes',
+    'field_font_sizes', 'field_colors', 'custom_fields',
+)
+
+# 布局结果中的一个元素，二维码的 size 为边长，文本的 size 为字号
+LabelElement = namedtuple("LabelElement", "kind col content x y size color")
+
+
+# 校验报告文件名
+VERIFY_REPORT_FILE = "verify_report.csv"
+
+# 二维码静区宽度（模块数）
+QR_BORDER = 2
+
+# 生成过程中进度条的最短刷新间隔（秒），避免向Tk事件队列灌入大量回调
+PROGRESS_INTERVAL = 0.1
+
+# 二维码缓存（矩阵、图片、位图、SVG路径）默认最多占用的内存（字节）
+QR_CACHE_BYTES = 64 * 1024 * 1024
+
+# 预览缩略图缓存默认最多占用的内存（字节）
+THUMBNAIL_CACHE_BYTES = 128 * 1024 * 1024
+
+
+def current_rss():
+    """当前进程的常驻内存（字节），Windows 读取工作集大小，Linux 读取 /proc，无法获取时返回 None"""
+    if sys.platform == "win32":
+        return _windows_working_set()
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def _windows_working_set():
+    try:
+        import ctypes
+        from ctypes import wintypes
+    except ImportError:
+        return None
+    
+    class ProcessMemoryCounters(ctypes.Structure):
+        _fields_ = [
+            ("cb", wintypes.DWORD),
+            ("PageFaultCount", wintypes.DWORD),
+            ("PeakWorkingSetSize", ctypes.c_size_t),
+            ("WorkingSetSize", ctypes.c_size_t),
+            ("QuotaPeakPagedPoolUsage", ctypes.c_size_t),
+            ("QuotaPagedPoolUsage", ctypes.c_size_t),
+            ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t),
+            ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+            ("PagefileUsage", ctypes.c_size_t),
+            ("PeakPagefileUsage", ctypes.c_size_t),
+        ]
+    
+    try:
+        kernel32 = ctypes.WinDLL("kernel32")
+        psapi = ctypes.WinDLL("psapi")
+        kernel32.GetCurrentProcess.restype = wintypes.HANDLE
+        psapi.GetProcessMemoryInfo.argtypes = [wintypes.HANDLE, ctypes.POINTER(ProcessMemoryCounters), wintypes.DWORD]
+        psapi.GetProcessMemoryInfo.restype = wintypes.BOOL
+        counters = ProcessMemoryCounters()
+        counters.cb = ctypes.sizeof(counters)
+        if not psapi.GetProcessMemoryInfo(kernel32.GetCurrentProcess(), ctypes.byref(counters), counters.cb):
+            return None
+        return counters.WorkingSetSize
+    except (OSError, AttributeError):
+        return None
+
+
+def cache_entry_bytes(value):
+    """估算缓存值占用的内存（字节），用于按字节数限制缓存"""
+    if isinstance(value, Image.Image):
+        return value.width * value.height * len(value.getbands())
+    if isinstance(value, list):
+        # 模块矩阵：每个元素一个指针，另加每行列表的开销
+        return sum(len(line) * 8 + 64 for line in value)
+    return sys.getsizeof(value)
+
+
+def layout_version(config):
+    """根据影响外观的配置项计算布局版本，配置不变时版本不变"""
+    layout = {key: config.get(key) for key in LAYOUT_KEYS}
+    data = json.dumps(layout, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(data.encode("utf-8")).hexdigest()[:16]
+
+
+# 配置文件格式版本；没有 version 字段的旧文件为第1版（多个按字段名索引的平行字典）
+CONFIG_VERSION = 2
+
+# 第2版配置中各分组的键与内存中配置字典键的对应关系
+CONFIG_SECTIONS = {
+    'label': [
+        ('width', 'label_width'), ('height', 'label_height'), ('qr_size', 'qr_size'),
+        ('bg_color', 'bg_color'), ('text_color', 'text_color'), ('qr_color', 'qr_color'),
+    ],
+    'output': [
+        ('dir', 'output_dir'), ('format', 'output_format'), ('printer_dpi', 'printer_dpi'),
+        ('width_mm', 'label_width_mm'), ('height_mm', 'label_height_mm'), ('printer_target', 'printer_target'),
+        ('memory_limit_mb', 'memory_limit_mb'), ('svg_columns', 'svg_columns'),
+    ],
+    'verify': [
+        ('enabled', 'verify_enabled'), ('sample_rate', 'verify_sample_rate'),
+        ('min_module_px', 'verify_min_module_px'), ('min_contrast', 'verify_min_contrast'),
+    ],
+}
+
+# 字段记录：custom 为自定义字段的固定内容，数据列为 None；color 未单独设置时为 None，渲染时使用 text_color
+FieldSpec = namedtuple("FieldSpec", "name display prefix suffix font_size color custom")
+
+HEX_COLOR = re.compile(r"^#[0-9A-Fa-f]{6}$")
+
+
+def field_specs(config):
+    """把配置字典中的平行字典整理为按 field_order 排列的字段记录"""
+    display_types = config.get('field_display_types', {})
+    prefixes = config.get('field_prefixes', {})
+    suffixes = config.get('field_suffixes', {})
+    font_sizes = config.get('field_font_sizes', {})
+    colors = config.get('field_colors', {})
+    custom_fields = config.get('custom_fields', {})
+    return [FieldSpec(col, display_types.get(col, "text"), prefixes.get(col, ""), suffixes.get(col, ""),
+                      int(font_sizes.get(col, 16)), colors.get(col), custom_fields.get(col))
+            for col in config.get('field_order', [])]
+
+
+def config_to_document(config):
+    """把内存中的配置字典转换为第2版配置文件内容，每个字段一条记录"""
+    document = {'version': CONFIG_VERSION}
+    for section, keys in CONFIG_SECTIONS.items():
+        values = {name: config[key] for name, key in keys if key in config}
+        if values:
+            document[section] = values
+    
+    # 旧文件中可能有不在 field_order 里的字段设置，追加在末尾以免丢失
+    field_order = list(config.get('field_order', []))
+    for key in ('field_display_types', 'field_prefixes', 'field_suffixes', 'field_font_sizes',
+                'field_colors', 'custom_fields'):
+        field_order += [col for col in config.get(key, {}) if col not in field_order]
+    
+    fields = []
+    for spec in field_specs(dict(config, field_order=field_order)):
+        record = {'name': spec.name, 'display': spec.display, 'prefix': spec.prefix, 'suffix': spec.suffix,
+                  'font_size': spec.font_size}
+        if spec.color is not None:
+            record['color'] = spec.color
+        if spec.custom is not None:
+            record['custom'] = spec.custom
+        fields.append(record)
+    document['fields'] = fields
+    return document
+
+
+def validate_document(document):
+    """检查第2版配置文件内容，返回问题列表"""
+    problems = []
+    
+    def check_color(value, where):
+        if not isinstance(value, str):
+            problems.append(f"{where} 必须是颜色字符串")
+        elif not HEX_COLOR.match(value):
+            try:
+                ImageColor.getrgb(value)
+            except ValueError:
+                problems.append(f"{where} 不是有效的颜色: {value}")
+    
+    def is_int(value):
+        return isinstance(value, int) and not isinstance(value, bool)
+    
+    def is_number(value):
+        return isinstance(value, (int, float)) and not isinstance(value, bool)
+    
+    for section in CONFIG_SECTIONS:
+        if not isinstance(document.get(section, {}), dict):
+            problems.append(f"{section} 必须是JSON对象")
+            document = dict(document, **{section: {}})
+    
+    label = document.get('label', {})
+    for key in ('width', 'height', 'qr_size'):
+        if key in label and (not is_int(label[key]) or label[key] <= 0):
+            problems.append(f"label.{key} 必须是正整数")
+    for key in ('bg_color', 'text_color', 'qr_color'):
+        if key in label:
+            check_color(label[key], f"label.{key}")
+    
+    output = document.get('output', {})
+    if 'format' in output and output['format'] not in ("png",) + tuple(SVG_FORMATS) + tuple(THERMAL_FORMATS):
+        problems.append(f"output.format 不支持: {output['format']}")
+    for key in ('dir', 'printer_target'):
+        if key in output and not isinstance(output[key], str):
+            problems.append(f"output.{key} 必须是字符串")
+    if isinstance(output.get('printer_target'), str) and output['printer_target'].startswith("tcp://"):
+        try:
+            parse_printer_address(output['printer_target'])
+        except ValueError as e:
+            problems.append(f"output.printer_target {str(e)}")
+    for key in ('printer_dpi', 'svg_columns'):
+        if key in output and (not is_int(output[key]) or output[key] <= 0):
+            problems.append(f"output.{key} 必须是正整数")
+    if 'memory_limit_mb' in output and (not is_int(output['memory_limit_mb']) or output['memory_limit_mb'] < 0):
+        problems.append("output.memory_limit_mb 必须是非负整数")
+    for key in ('width_mm', 'height_mm'):
+        # 界面中为输入框内容，留空表示按像素尺寸换算
+        value = output.get(key, "")
+        if isinstance(value, str) and value.strip():
+            try:
+                value = float(value)
+            except ValueError:
+                pass
+        if value != "" and not (is_number(value) and value > 0):
+            problems.append(f"output.{key} 必须是正数或留空")
+    
+    verify = document.get('verify', {})
+    if 'enabled' in verify and not isinstance(verify['enabled'], bool):
+        problems.append("verify.enabled 必须是 true 或 false")
+    if 'sample_rate' in verify and not (is_number(verify['sample_rate']) and 0 <= verify['sample_rate'] <= 1):
+        problems.append("verify.sample_rate 必须是 0 到 1 之间的数")
+    if 'min_module_px' in verify and not (is_number(verify['min_module_px']) and verify['min_module_px'] > 0):
+        problems.append("verify.min_module_px 必须是正数")
+    if 'min_contrast' in verify and not (is_number(verify['min_contrast']) and 1 <= verify['min_contrast'] <= 21):
+        problems.append("verify.min_contrast 必须是 1 到 21 之间的数")
+    
+    fields = document.get('fields', [])
+    if not isinstance(fields, list):
+        return problems + ["fields 必须是数组"]
+    names = set()
+    for i, record in enumerate(fields):
+        where = f"fields[{i}]"
+        if not isinstance(record, dict) or not isinstance(record.get('name'), str) or not record['name']:
+            problems.append(f"{where} 缺少字段名")
+            continue
+        where = f"{where}（{record['name']}）"
+        if record['name'] in names:
+            problems.append(f"{where} 字段名重复")
+        names.add(record['name'])
+        if record.get('display', "text") not in ("text", "qrcode"):
+            problems.append(f"{where} display 必须是 text 或 qrcode")
+        for key in ('prefix', 'suffix', 'custom'):
+            if record.get(key) is not None and not isinstance(record[key], str):
+                problems.append(f"{where} {key} 必须是字符串")
+        font_size = record.get('font_size', 16)
+        if not isinstance(font_size, int) or isinstance(font_size, bool) or font_size <= 0:
+            problems.append(f"{where} font_size 必须是正整数")
+        if 'color' in record:
+            check_color(record['color'], f"{where} color")
+    return problems
+
+
+def config_from_document(document):
+    """把第2版配置文件内容转换为内存中的配置字典，内容无效时抛出 ValueError"""
+    version = document.get('version')
+    if version != CONFIG_VERSION:
+        raise ValueError(f"不支持的配置版本: {version}")
+    problems = validate_document(document)
+    if problems:
+        raise ValueError("配置无效:\n" + "\n".join(problems))
+    
+    config = {}
+    for section, keys in CONFIG_SECTIONS.items():
+        values = document.get(section, {})
+        for name, key in keys:
+            if name in values:
+                config[key] = values[name]
+    
+    fields = document.get('fields', [])
+    config['field_order'] = [record['name'] for record in fields]
+    config['field_display_types'] = {record['name']: record.get('display', "text") for record in fields}
+    config['field_prefixes'] = {record['name']: record.get('prefix', "") for record in fields}
+    config['field_suffixes'] = {record['name']: record.get('suffix', "") for record in fields}
+    config['field_font_sizes'] = {record['name']: record.get('font_size', 16) for record in fields}
+    config['field_colors'] = {record['name']: record['color'] for record in fields if 'color' in record}
+    config['custom_fields'] = {record['name']: record['custom'] for record in fields
+                               if record.get('custom') is not None}
+    return config
+
+
+def migrate_config(data):
+    """把任意版本的配置文件内容升级为第2版"""
+    version = data.get('version', 1)
+    if not isinstance(version, int) or isinstance(version, bool):
+        raise ValueError(f"不支持的配置版本: {version}")
+    if version > CONFIG_VERSION:
+        raise ValueError(f"配置版本 {version} 高于程序支持的版本 {CONFIG_VERSION}")
+    if version < CONFIG_VERSION:
+        # 第1版：字体大小保存为下拉框中的字符串
+        data = {key: value for key, value in data.items() if key != 'version'}
+        data['field_font_sizes'] = {k: int(v) for k, v in data.get('field_font_sizes', {}).items()}
+        return config_to_document(data)
+    return data
+
+
+def read_config_file(path=CONFIG_FILE):
+    """读取并校验标签配置文件，旧格式自动迁移，文件不存在时返回空配置"""
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return config_from_document(migrate_config(json.load(f)))
+
+
+def write_config_file(config, path=CONFIG_FILE):
+    """以第2版紧凑格式保存配置"""
+    document = config_to_document(config)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(document, f, ensure_ascii=False, separators=(",", ":"))
+
+
+# 已编译的渲染器，按布局版本和内存上限复用
+_renderer_cache = OrderedDict()
+_renderer_cache_lock = threading.Lock()
+
+
+def get_renderer(config, max_cached=8):
+    """返回与配置对应的渲染器，布局相同时复用已编译的渲染器及其字体和二维码缓存"""
+    key = (layout_version(config), int(config.get('memory_limit_mb') or 0))
+    with _renderer_cache_lock:
+        renderer = _renderer_cache.get(key)
+        if renderer is not None:
+            _renderer_cache.move_to_end(key)
+            return renderer
+        renderer = LabelRenderer(config)
+        _renderer_cache[key] = renderer
+        while len(_renderer_cache) > max_cached:
+            _renderer_cache.popitem(last=False)
+        return renderer
+
+
+class LabelRenderer:
+    """根据配置渲染标签的无界面渲染器，字体和二维码图片常驻缓存，可在多个线程间共享"""
+
+    def __init__(self, config, qr_cache_bytes=QR_CACHE_BYTES):
+        self.memory_limit_mb = int(config.get('memory_limit_mb') or 0)
+        self.label_width = int(config.get('label_width', 300))
+        self.label_height = int(config.get('label_height', 400))
+        self.qr_size = int(config.get('qr_size', 150))
+        self.bg_color = config.get('bg_color', '#FFFFFF')
+        self.text_color = config.get('text_color', '#000000')
+        self.qr_color = config.get('qr_color', '#000000')
+        # 编译为按顺序排列的字段记录，渲染每行时不再逐个查字典
+        self.fields = field_specs(config)
+        
+        # 按字节数限制缓存：内容各不相同时缓存不会命中，条目大小差别也很大
+        self.qr_cache_bytes = qr_cache_bytes
+        if self.memory_limit_mb:
+            # 缓存最多占用内存上限的四分之一
+            self.qr_cache_bytes = min(qr_cache_bytes, self.memory_limit_mb * 1024 * 1024 // 4)
+        self._fonts = {}
+        self._qr_cache = OrderedDict()
+        self._qr_cache_used = 0
+        self._lock = threading.Lock()
+    
+    def get_font(self, font_size):
+        font = self._fonts.get(font_size)
+        if font is None:
+            try:
+                font = ImageFont.truetype(DEFAULT_FONT_FILE, font_size)
+            except:
+                font = ImageFont.load_default()
+            self._fonts[font_size] = font
+        return font
+    
+    def _cached(self, key, factory):
+        """按key做LRU缓存，多个渲染线程共享，总大小不超过 qr_cache_bytes"""
+        with self._lock:
+            entry = self._qr_cache.get(key)
+            if entry is not None:
+                self._qr_cache.move_to_end(key)
+                return entry[0]
+        
+        value = factory()
+        size = cache_entry_bytes(value)
+        if size > self.qr_cache_bytes:
+            return value
+        
+        with self._lock:
+            old = self._qr_cache.pop(key, None)
+            if old is not None:
+                self._qr_cache_used -= old[1]
+            self._qr_cache[key] = (value, size)
+            self._qr_cache_used += size
+            while self._qr_cache_used > self.qr_cache_bytes:
+                _, (_, evicted) = self._qr_cache.popitem(last=False)
+                self._qr_cache_used -= evicted
+        return value
+    
+    def clear_caches(self):
+        with self._lock:
+            self._qr_cache.clear()
+            self._qr_cache_used = 0
+    
+    def over_memory_limit(self):
+        """超过配置的内存上限时清空二维码缓存并回收内存，返回是否超限"""
+        if not self.memory_limit_mb:
+            return False
+        rss = current_rss()
+        if rss is None or rss <= self.memory_limit_mb * 1024 * 1024:
+            return False
+        self.clear_caches()
+        gc.collect()
+        return True
+    
+    def canvas_pool(self, size=2):
+        """创建画布池，设置了内存上限时按画布大小减少池中画布数量"""
+        if self.memory_limit_mb:
+            canvas_bytes = self.label_width * self.label_height * 3
+            size = max(1, min(size, self.memory_limit_mb * 1024 * 1024 // 4 // canvas_bytes))
+        template = Image.new('RGB', (self.label_width, self.label_height), color=self.bg_color)
+        return CanvasPool(template, size)
+    
+    def get_qr_matrix(self, content):
+        """返回二维码模块矩阵（含静区），True 表示深色模块"""
+        def build():
+            qr = qrcode.QRCode(version=1, box_size=5, border=QR_BORDER)
+            qr.add_data(content)
+            qr.make(fit=True)
+            return qr.get_matrix()
+        return self._cached(("matrix", content), build)
+    
+    def get_qr_image(self, content, size=None):
+        """返回缩放到 size（默认 qr_size）的彩色二维码图片"""
+        size = size or self.qr_size
+        def build():
+            # 由缓存的模块矩阵生成，与 make_image(box_size=5) 后缩放的结果一致，且每个内容只编码一次
+            matrix = self.get_qr_matrix(content)
+            n = len(matrix)
+            fill = ImageColor.getrgb(self.qr_color)
+            back = ImageColor.getrgb(self.bg_color)
+            qr_img = Image.new('RGB', (n, n))
+            qr_img.putdata([fill if dark else back for line in matrix for dark in line])
+            return qr_img.resize((n * 5, n * 5), Image.NEAREST).resize((size, size))
+        return self._cached(("image", content, size), build)
+    
+    def field_content(self, field, row):
+        """拼接字段的前缀、内容和后缀"""
+        if field.custom is not None:
+            content = field.custom  # 自定义字段内容
+        else:
+            content = str(row.get(field.name, ""))  # Excel数据内容
+        return f"{field.prefix}{content}{field.suffix}"
+    
+    def layout(self, row, scale=1.0):
+        """计算一行数据中各字段在标签上的位置，scale 用于按打印机分辨率放大"""
+        elements = []
+        width = self.label_width * scale
+        current_y = 20 * scale
+        
+        for field in self.fields:
+            full_content = self.field_content(field, row)
+            
+            if field.display == "qrcode":
+                size = round(self.qr_size * scale)
+                x = (round(width) - size) // 2
+                elements.append(LabelElement("qrcode", field.name, full_content, x, round(current_y), size,
+                                             self.qr_color))
+                current_y += size + 20 * scale
+            else:
+                font_size = max(1, round(field.font_size * scale))
+                font = self.get_font(font_size)
+                
+                text_width = font.getlength(full_content)
+                x = (width - text_width) // 2
+                elements.append(LabelElement("text", field.name, full_content, x, round(current_y), font_size,
+                                             field.color or self.text_color))
+                current_y += font_size + 10 * scale
+        
+        return elements
+    
+    def render(self, row, canvas=None, scale=1.0):
+        """渲染一行数据，传入画布池中取出的 (图片, 画笔) 时直接在其上绘制，scale 小于1时渲染缩略图"""
+        if canvas is None:
+            size = (max(1, round(self.label_width * scale)), max(1, round(self.label_height * scale)))
+            img = Image.new('RGB', size, color=self.bg_color)
+            draw = ImageDraw.Draw(img)
+        else:
+            img, draw = canvas
+        
+        for element in self.layout(row, scale):
+            if element.kind == "qrcode":
+                img.paste(self.get_qr_image(element.content, element.size), (element.x, element.y))
+            else:
+                draw.text((element.x, element.y), element.content, fill=element.color,
+                          font=self.get_font(element.size))
+        
+        return img
+    
+    def render_png(self, row, pool=None):
+        buf = io.BytesIO()
+        if pool is None:
+            self.render(row).save(buf, format="PNG")
+        else:
+            with pool.canvas() as canvas:
+                self.render(row, canvas).save(buf, format="PNG")
+        return buf.getvalue()
+
+
+class CanvasPool:
+    """预分配的标签画布池，画布归还后从背景模板重置再复用
+
+    池中画布用尽时 acquire 会阻塞，从而限制同时占用的画布内存。
+    """
+
+    def __init__(self, template, size=2):
+        self.template = template
+        self.size = size
+        self._free = queue.Queue()
+        for _ in range(size):
+            img = template.copy()
+            self._free.put((img, ImageDraw.Draw(img)))
+    
+    def acquire(self):
+        img, draw = self._free.get()
+        img.paste(self.template)
+        return img, draw
+    
+    def release(self, canvas):
+        self._free.put(canvas)
+    
+    @contextmanager
+    def canvas(self):
+        canvas = self.acquire()
+        try:
+            yield canvas
+        finally:
+            self.release(canvas)
+
+
+class ThumbnailCache:
+    """渲染结果的LRU缓存，按 (行号, 数据和布局版本, 缩放比例) 索引，可在线程间共享
+
+    按图片占用的字节数限制总大小，整尺寸的单行预览和缩略图共用同一额度。
+    """
+
+    def __init__(self, max_bytes=THUMBNAIL_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.used = 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, key):
+        with self._lock:
+            entry = self._items.get(key)
+            if entry is None:
+                return None
+            self._items.move_to_end(key)
+            return entry[0]
+    
+    def put(self, key, img):
+        size = cache_entry_bytes(img)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self.used -= old[1]
+            self._items[key] = (img, size)
+            self.used += size
+            while self.used > self.max_bytes:
+                _, (_, evicted) = self._items.popitem(last=False)
+                self.used -= evicted
+    
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._items
+    
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self.used = 0
+
+
+def zpl_field_data(content):
+    """转义 ^FD 字段数据中的控制字符，配合 ^FH_ 使用，防止数据提前结束字段或注入指令"""
+    return content.replace("_", "_5F").replace("^", "_5E").replace("~", "_7E")
+
+
+class ThermalEncoder:
+    """按打印机分辨率把标签直接渲染为1位图，并编码为ZPL/EPL/ESC-POS指令流
+
+    二维码按整数倍模块尺寸绘制，不经过缩放插值，保证打印清晰。
+    zpl-native 格式不栅格化二维码，而是输出打印机自带的 ^BQ 指令。
+    """
+
+    def __init__(self, renderer, output_format="zpl", dpi=203, width_mm=None, height_mm=None, threshold=128):
+        if output_format not in THERMAL_FORMATS:
+            raise ValueError(f"不支持的打印格式: {output_format}")
+        
+        self.renderer = renderer
+        self.output_format = output_format
+        self.dpi = int(dpi)
+        self.threshold = threshold
+        
+        width = round(float(width_mm) / 25.4 * self.dpi) if width_mm else renderer.label_width
+        self.scale = width / renderer.label_width
+        # 宽度取8的整数倍，避免每行末尾的填充位被打印出来
+        self.width = (width + 7) // 8 * 8
+        if height_mm:
+            self.height = round(float(height_mm) / 25.4 * self.dpi)
+        else:
+            self.height = round(renderer.label_height * self.scale)
+    
+    @property
+    def extension(self):
+        return THERMAL_FORMATS[self.output_format]
+    
+    def get_qr_bitmap(self, content, box):
+        """按模块尺寸 box 生成二维码位图，黑色为0"""
+        def build():
+            matrix = self.renderer.get_qr_matrix(content)
+            n = len(matrix)
+            qr_img = Image.new("1", (n, n), 1)
+            qr_img.putdata([0 if dark else 1 for line in matrix for dark in line])
+            return qr_img.resize((n * box, n * box), Image.NEAREST)
+        return self.renderer._cached(("bitmap", content, box), build)
+    
+    def native_qr_geometry(self, element):
+        """zpl-native 的 ^BQ 参数：放大倍数（每个模块的点数，打印机最大支持10）和符号相对元素的偏移"""
+        modules = len(self.renderer.get_qr_matrix(element.content))
+        magnification = max(1, min(10, element.size // modules))
+        # 矩阵含2个模块的静区，^BQ 只绘制符号本身
+        margin = (element.size - magnification * modules) // 2 + QR_BORDER * magnification
+        return magnification, margin
+    
+    def render_bitmap(self, row, include_qr=True):
+        """渲染1位图，返回 (位图, 二维码元素列表)"""
+        canvas = Image.new("L", (self.width, self.height), 255)
+        draw = ImageDraw.Draw(canvas)
+        qr_elements = []
+        
+        for element in self.renderer.layout(row, self.scale):
+            if element.kind == "qrcode":
+                qr_elements.append(element)
+                if include_qr:
+                    modules = len(self.renderer.get_qr_matrix(element.content))
+                    box = max(1, element.size // modules)
+                    offset = (element.size - box * modules) // 2
+                    canvas.paste(self.get_qr_bitmap(element.content, box),
+                                 (element.x + offset, element.y + offset))
+            else:
+                draw.text((element.x, element.y), element.content, fill=0,
+                          font=self.renderer.get_font(element.size))
+        
+        bitmap = canvas.point(lambda v: 255 if v >= self.threshold else 0, mode="1")
+        return bitmap, qr_elements
+    
+    def encode(self, row):
+        if self.output_format == "zpl":
+            return self._encode_zpl(*self.render_bitmap(row), native_qr=False)
+        if self.output_format == "zpl-native":
+            return self._encode_zpl(*self.render_bitmap(row, include_qr=False), native_qr=True)
+        
+        bitmap, _ = self.render_bitmap(row)
+        if self.output_format == "epl":
+            return self._encode_epl(bitmap)
+        return self._encode_escpos(bitmap)
+    
+    @staticmethod
+    def _dots(bitmap):
+        """打印点为1的逐行打包数据"""
+        return ImageChops.invert(bitmap).tobytes()
+    
+    def _encode_zpl(self, bitmap, qr_elements, native_qr):
+        bytes_per_row = self.width // 8
+        data = self._dots(bitmap)
+        
+        # ZPL ASCII压缩：":" 重复上一行，"," 表示本行剩余全为0
+        lines = []
+        previous = None
+        for offset in range(0, len(data), bytes_per_row):
+            line = data[offset:offset + bytes_per_row].hex().upper()
+            if line == previous:
+                lines.append(":")
+                continue
+            previous = line
+            stripped = line.rstrip("0")
+            lines.append(stripped + "," if len(stripped) < len(line) else line)
+        
+        total = len(data)
+        parts = [
+            "^XA",
+            "^CI28",
+            f"^PW{self.width}",
+            f"^LL{self.height}",
+            f"^FO0,0^GFA,{total},{total},{bytes_per_row},{''.join(lines)}^FS",
+        ]
+        if native_qr:
+            for element in qr_elements:
+                magnification, margin = self.native_qr_geometry(element)
+                parts.append(f"^FO{element.x + margin},{element.y + margin}"
+                             f"^BQN,2,{magnification}^FH_^FDMA,{zpl_field_data(element.content)}^FS")
+        parts.append("^XZ")
+        return ("\n".join(parts) + "\n").encode("utf-8")
+    
+    def _encode_epl(self, bitmap):
+        # EPL的 GW 指令中0为打印点，与PIL的1位图一致
+        bytes_per_row = self.width // 8
+        header = f"\nN\nq{self.width}\nQ{self.height},24\nGW0,0,{bytes_per_row},{self.height},"
+        return header.encode("ascii") + bitmap.tobytes() + b"\nP1\n"
+    
+    def _encode_escpos(self, bitmap):
+        bytes_per_row = self.width // 8
+        data = self._dots(bitmap)
+        out = bytearray(b"\x1b@")
+        # GS v 0 光栅位图，按256行分段发送，兼容缓冲区较小的打印机
+        band = 256
+        for top in range(0, self.height, band):
+            rows = min(band, self.height - top)
+            out += b"\x1dv0\x00" + bytes([bytes_per_row & 0xFF, bytes_per_row >> 8, rows & 0xFF, rows >> 8])
+            out += data[top * bytes_per_row:(top + rows) * bytes_per_row]
+        # 走纸并切纸
+        out += b"\x1bd\x03\x1dVB\x00"
+        return bytes(out)
+
+
+def parse_printer_address(target):
+    """解析 tcp://主机:端口 形式的打印机地址，格式无效时抛出 ValueError"""
+    host, _, port = target[len("tcp://"):].rpartition(":")
+    if not host or not port.isdigit() or not 0 < int(port) < 65536:
+        raise ValueError(f"打印机地址应为 tcp://主机:端口，例如 tcp://192.168.1.50:9100，而不是 {target}")
+    return host.strip("[]"), int(port)
+
+
+class PrinterOutput:
+    """打印指令的输出目标
+
+    tcp://主机:端口  直接发送到网络打印机（通常为9100端口）
+    已存在的目录     作为假脱机目录，每个标签写成一个任务文件
+    其他路径         所有标签依次写入同一个文件
+    """
+
+    def __init__(self, target, extension=".prn"):
+        self.target = target
+        self.extension = extension
+        self.count = 0
+        self._sock = None
+        self._file = None
+    
+    def __enter__(self):
+        if self.target.startswith("tcp://"):
+            self._sock = socket.create_connection(parse_printer_address(self.target), timeout=30)
+        elif not os.path.isdir(self.target):
+            self._file = open(self.target, "wb")
+        return self
+    
+    def write(self, data):
+        if self._sock is not None:
+            self._sock.sendall(data)
+        elif self._file is not None:
+            self._file.write(data)
+        else:
+            # 先写临时文件再改名，避免假脱机程序读到写了一半的任务
+            name = os.path.join(self.target, f"job_{self.count + 1:06d}{self.extension}")
+            with open(name + ".tmp", "wb") as f:
+                f.write(data)
+            os.replace(name + ".tmp", name)
+        self.count += 1
+    
+    def __exit__(self, *exc):
+        if self._sock is not None:
+            self._sock.close()
+        if self._file is not None:
+            self._file.close()
+        return False
+
+
+def qr_path_data(matrix):
+    """把二维码矩阵中连续的深色模块合并为矩形，生成以模块为单位的SVG路径"""
+    parts = []
+    for y, line in enumerate(matrix):
+        x = 0
+        n = len(line)
+        while x < n:
+            if line[x]:
+                start = x
+                while x < n and line[x]:
+                    x += 1
+                parts.append(f"M{start} {y}h{x - start}v1h-{x - start}z")
+            else:
+                x += 1
+    return "".join(parts)
+
+
+def svg_font_family(font_file=DEFAULT_FONT_FILE):
+    """SVG文本使用的字体族，与栅格输出使用同一字体，查看端缺少该字体时回退到无衬线字体"""
+    try:
+        family = ImageFont.truetype(font_file, 16).getname()[0]
+    except OSError:
+        name = os.path.basename(font_file)
+        family = FONT_FAMILIES.get(name.lower(), os.path.splitext(name)[0])
+    return f"'{family}', sans-serif"
+
+
+class SvgDocument:
+    """把多个标签按列平铺到一个SVG文档中，相同内容的二维码只定义一次路径"""
+
+    def __init__(self, encoder, count, columns=1, gap=10):
+        self.encoder = encoder
+        self.count = count
+        self.columns = max(1, columns)
+        self.gap = gap
+        self.index = 0
+        self.qr_ids = {}
+    
+    def header(self):
+        renderer = self.encoder.renderer
+        rows = max(1, (self.count + self.columns - 1) // self.columns)
+        width = self.columns * renderer.label_width + (self.columns - 1) * self.gap
+        height = rows * renderer.label_height + (rows - 1) * self.gap
+        return self.encoder.svg_open(width, height)
+    
+    def label(self, items):
+        """items 为 SvgEncoder.prepare 的结果，这里只分配位置和二维码路径编号"""
+        renderer = self.encoder.renderer
+        x = (self.index % self.columns) * (renderer.label_width + self.gap)
+        y = (self.index // self.columns) * (renderer.label_height + self.gap)
+        self.index += 1
+        return self.encoder.svg_label(items, self.qr_ids, x, y)
+    
+    def footer(self):
+        return "</svg>\n"
+
+
+class SvgEncoder:
+    """矢量SVG输出，二维码输出为合并后的路径，文本输出为 <text> 元素"""
+
+    def __init__(self, renderer, output_format="svg", columns=1, gap=10):
+        if output_format not in SVG_FORMATS:
+            raise ValueError(f"不支持的SVG格式: {output_format}")
+        self.renderer = renderer
+        self.output_format = output_format
+        self.columns = columns
+        self.gap = gap
+        self.font_family = svg_font_family()
+    
+    @property
+    def extension(self):
+        return SVG_FORMATS[self.output_format]
+    
+    def get_qr_path(self, content):
+        return self.renderer._cached(("path", content),
+                                     lambda: qr_path_data(self.renderer.get_qr_matrix(content)))
+    
+    def svg_open(self, width, height):
+        return (f'<svg xmlns="http://www.w3.org/2000/svg" xmlns:xlink="http://www.w3.org/1999/xlink" '
+                f'width="{width}" height="{height}" viewBox="0 0 {width} {height}">\n')
+    
+    def prepare(self, row):
+        """计算一个标签的布局、二维码路径和文字基线，可在渲染线程中并行执行
+
+        返回 (元素, 附加数据) 列表：二维码附带路径和缩放比例，文本附带基线位置。
+        """
+        renderer = self.renderer
+        items = []
+        for element in renderer.layout(row):
+            if element.kind == "qrcode":
+                scale = element.size / len(renderer.get_qr_matrix(element.content))
+                items.append((element, (self.get_qr_path(element.content), scale)))
+            else:
+                # SVG文本以基线定位，按字体上升高度换算，与栅格输出位置一致
+                items.append((element, element.y + renderer.get_font(element.size).getmetrics()[0]))
+        return items
+    
+    def svg_label(self, items, qr_ids, x=0, y=0):
+        """由 prepare 的结果生成一个标签的 <g> 元素，qr_ids 记录文档中已定义的二维码路径"""
+        renderer = self.renderer
+        parts = [f'<g transform="translate({x},{y})">',
+                 f'<rect width="{renderer.label_width}" height="{renderer.label_height}" '
+                 f'fill={quoteattr(renderer.bg_color)}/>']
+        center = renderer.label_width / 2
+        
+        for element, extra in items:
+            if element.kind == "qrcode":
+                path, scale = extra
+                qr_id = qr_ids.get(element.content)
+                if qr_id is None:
+                    qr_id = f"qr{len(qr_ids) + 1}"
+                    qr_ids[element.content] = qr_id
+                    parts.append(f'<defs><path id="{qr_id}" d="{path}"/></defs>')
+                parts.append(f'<use xlink:href="#{qr_id}" fill={quoteattr(element.color)} '
+                             f'shape-rendering="crispEdges" '
+                             f'transform="translate({element.x},{element.y}) scale({scale:g})"/>')
+            else:
+                parts.append(f'<text x="{center:g}" y="{extra}" text-anchor="middle" '
+                             f'font-family={quoteattr(self.font_family)} '
+                             f'font-size="{element.size}" fill={quoteattr(element.color)}>'
+                             f'{escape(element.content)}</text>')
+        
+        parts.append("</g>\n")
+        return "".join(parts)
+    
+    def document(self, count):
+        return SvgDocument(self, count, self.columns, self.gap)
+    
+    def iter_document(self, labels, count):
+        """逐段产出包含所有标签的SVG文档，labels 为按顺序排列的 prepare 结果"""
+        document = self.document(count)
+        yield document.header()
+        for items in labels:
+            yield document.label(items)
+        yield document.footer()
+    
+    def encode(self, row):
+        renderer = self.renderer
+        svg = (self.svg_open(renderer.label_width, renderer.label_height)
+               + self.svg_label(self.prepare(row), {}) + "</svg>\n")
+        return svg.encode("utf-8")
+
+
+def encoder_from_config(renderer, config, output_format=None):
+    """按输出格式创建热敏打印或SVG编码器，打印机分辨率和标签物理尺寸取自配置"""
+    output_format = output_format or config.get('output_format', "png")
+    if output_format in SVG_FORMATS:
+        return SvgEncoder(renderer, output_format, columns=int(config.get('svg_columns', 1)))
+    return ThermalEncoder(renderer, output_format,
+                          dpi=config.get('printer_dpi', 203),
+                          width_mm=config.get('label_width_mm') or None,
+                          height_mm=config.get('label_height_mm') or None)
+
+
+def pdf_page_data(img):
+    """把标签图片压缩为PDF页面数据 (宽, 高, Flate压缩的RGB数据)，可在渲染线程中并行执行"""
+    img = img.convert("RGB")
+    return img.width, img.height, zlib.compress(img.tobytes(), 6)
+
+
+class PdfStreamWriter:
+    """逐页写出多页PDF，写出的页面不再保留在内存中
+
+    页面树和目录的对象编号预先保留，与交叉引用表一起在 close 时写出，
+    因此不需要知道总页数，也不需要回写已发送的内容。
+    """
+
+    def __init__(self, out):
+        self.out = out
+        self.position = 0
+        self.offsets = {}
+        self.pages = []
+        self._ids = itertools.count(3)  # 1 为目录，2 为页面树
+        self._write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+    
+    def _write(self, data):
+        self.out.write(data)
+        self.position += len(data)
+    
+    def _object(self, obj_id, body, stream=None):
+        self.offsets[obj_id] = self.position
+        self._write(f"{obj_id} 0 obj\n{body}".encode("ascii"))
+        if stream is not None:
+            self._write(b"\nstream\n" + stream + b"\nendstream")
+        self._write(b"\nendobj\n")
+    
+    def add_page(self, width, height, data):
+        """写出一页，参数为 pdf_page_data 的结果，页面尺寸按72dpi与像素一致"""
+        image_id, content_id, page_id = next(self._ids), next(self._ids), next(self._ids)
+        self._object(image_id, f"<< /Type /XObject /Subtype /Image /Width {width} /Height {height} "
+                               f"/ColorSpace /DeviceRGB /BitsPerComponent 8 /Filter /FlateDecode "
+                               f"/Length {len(data)} >>", data)
+        content = f"q {width} 0 0 {height} 0 0 cm /Im0 Do Q".encode("ascii")
+        self._object(content_id, f"<< /Length {len(content)} >>", content)
+        self._object(page_id, f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {width} {height}] "
+                              f"/Resources << /XObject << /Im0 {image_id} 0 R >> >> /Contents {content_id} 0 R >>")
+        self.pages.append(page_id)
+    
+    def close(self):
+        kids = " ".join(f"{page_id} 0 R" for page_id in self.pages)
+        self._object(2, f"<< /Type /Pages /Kids [{kids}] /Count {len(self.pages)} >>")
+        self._object(1, "<< /Type /Catalog /Pages 2 0 R >>")
+        xref = self.position
+        size = max(self.offsets) + 1
+        entries = ["0000000000 65535 f \n"] + [f"{self.offsets[i]:010d} 00000 n \n" for i in range(1, size)]
+        self._write(f"xref\n0 {size}\n{''.join(entries)}"
+                    f"trailer\n<< /Size {size} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode("ascii"))
+
+
+def contrast_ratio(color1, color2):
+    """两种颜色的WCAG对比度（1 到 21）"""
+    def luminance(color):
+        channels = []
+        for value in ImageColor.getrgb(color)[:3]:
+            value /= 255
+            channels.append(value / 12.92 if value <= 0.03928 else ((value + 0.055) / 1.055) ** 2.4)
+        return 0.2126 * channels[0] + 0.7152 * channels[1] + 0.0722 * channels[2]
+    
+    lighter, darker = sorted((luminance(color1), luminance(color2)), reverse=True)
+    return (lighter + 0.05) / (darker + 0.05)
+
+
+def _qr_function_modules(version):
+    """标记定位、分隔、定时、校正、格式和版本信息等功能图形所在的模块"""
+    n = version * 4 + 17
+    function = [[False] * n for _ in range(n)]
+    
+    def mark(top, left, height, width):
+        for r in range(max(0, top), min(n, top + height)):
+            for c in range(max(0, left), min(n, left + width)):
+                function[r][c] = True
+    
+    # 定位图形、分隔符和格式信息
+    mark(0, 0, 9, 9)
+    mark(0, n - 8, 9, 8)
+    mark(n - 8, 0, 8, 9)
+    # 校正图形，与定位图形重叠的位置不绘制（与定时图形重叠的照常绘制，所以先于定时图形标记）
+    positions = qr_util.pattern_position(version)
+    for r in positions:
+        for c in positions:
+            if not function[r][c]:
+                mark(r - 2, c - 2, 5, 5)
+    # 定时图形
+    mark(6, 0, 1, n)
+    mark(0, 6, n, 1)
+    # 版本信息
+    if version >= 7:
+        mark(0, n - 11, 6, 3)
+        mark(n - 11, 0, 3, 6)
+    return function
+
+
+def decode_qr_matrix(modules):
+    """解码不含静区的二维码模块矩阵，返回原始字节
+
+    只支持本程序生成的二维码（数字、字母数字和字节模式），不做纠错，
+    任何一个数据模块读错都会导致解码失败或结果不一致，校验结果因此偏严格。
+    """
+    n = len(modules)
+    version = (n - 17) // 4
+    if version < 1 or version > 40 or version * 4 + 17 != n:
+        raise ValueError(f"二维码尺寸无效: {n}")
+    
+    # 格式信息：与所有合法取值比较，取汉明距离最小的
+    bits = 0
+    for i in range(15):
+        if i < 6:
+            dark = modules[i][8]
+        elif i < 8:
+            dark = modules[i + 1][8]
+        else:
+            dark = modules[n - 15 + i][8]
+        bits |= int(dark) << i
+    distance, format_data = min((bin(qr_util.BCH_type_info(data) ^ bits).count("1"), data) for data in range(32))
+    if distance > 3:
+        raise ValueError("格式信息无法识别")
+    error_correction, mask_pattern = format_data >> 3, format_data & 7
+    
+    # 按Z字形顺序读出数据位并去掩码
+    function = _qr_function_modules(version)
+    mask = qr_util.mask_func(mask_pattern)
+    data_bits = []
+    row, inc = n - 1, -1
+    for col in range(n - 1, 0, -2):
+        if col <= 6:
+            col -= 1
+        while True:
+            for c in (col, col - 1):
+                if not function[row][c]:
+                    data_bits.append(modules[row][c] != mask(row, c))
+            row += inc
+            if row < 0 or row >= n:
+                row -= inc
+                inc = -inc
+                break
+    
+    codewords = [int("".join("1" if b else "0" for b in data_bits[i:i + 8]), 2)
+                 for i in range(0, len(data_bits) - 7, 8)]
+    
+    # 数据码字按块交错排列
+    blocks = rs_blocks(version, error_correction)
+    data = [[] for _ in blocks]
+    position = 0
+    for i in range(max(block.data_count for block in blocks)):
+        for block_index, block in enumerate(blocks):
+            if i < block.data_count:
+                data[block_index].append(codewords[position])
+                position += 1
+    stream = "".join(f"{value:08b}" for block in data for value in block)
+    
+    # 解析数据段
+    result = bytearray()
+    pos = 0
+    
+    def read(count):
+        nonlocal pos
+        if pos + count > len(stream):
+            raise ValueError("数据段不完整")
+        value = int(stream[pos:pos + count], 2)
+        pos += count
+        return value
+    
+    while pos + 4 <= len(stream):
+        mode = read(4)
+        if mode == 0:
+            break
+        if mode not in (qr_util.MODE_NUMBER, qr_util.MODE_ALPHA_NUM, qr_util.MODE_8BIT_BYTE):
+            raise ValueError(f"不支持的数据模式: {mode}")
+        count = read(qr_util.length_in_bits(mode, version))
+        if mode == qr_util.MODE_NUMBER:
+            while count >= 3:
+                result += f"{read(10):03d}".encode("ascii")
+                count -= 3
+            if count == 2:
+                result += f"{read(7):02d}".encode("ascii")
+            elif count == 1:
+                result += f"{read(4):01d}".encode("ascii")
+        elif mode == qr_util.MODE_ALPHA_NUM:
+            while count >= 2:
+                value = read(11)
+                result += bytes([qr_util.ALPHA_NUM[value // 45], qr_util.ALPHA_NUM[value % 45]])
+                count -= 2
+            if count == 1:
+                result += bytes([qr_util.ALPHA_NUM[read(6)]])
+        else:
+            result += bytes(read(8) for _ in range(count))
+    return bytes(result)
+
+
+def sample_qr_modules(img, x, y, size, modules, border=QR_BORDER):
+    """在渲染结果上按模块中心取样，以区域内最亮和最暗的中间值二值化，返回去掉静区的模块矩阵"""
+    gray = img.convert("L")
+    step = size / modules
+    values = [[gray.getpixel((min(gray.width - 1, int(x + (c + 0.5) * step)),
+                              min(gray.height - 1, int(y + (r + 0.5) * step))))
+               for c in range(modules)] for r in range(modules)]
+    flat = [v for line in values for v in line]
+    threshold = (min(flat) + max(flat)) / 2
+    return [[v < threshold for v in line[border:modules - border]] for line in values[border:modules - border]]
+
+
+class LabelVerifier:
+    """生成过程中的校验：重复内容、二维码模块尺寸和颜色对比度，并抽样解码渲染出的二维码
+
+    校验在独立线程中进行，与渲染并行；队列有上限，校验跟不上时渲染会短暂等待。
+    """
+
+    def __init__(self, renderer, encoder=None, sample_rate=0.01, min_module_px=3, min_contrast=3.0):
+        self.renderer = renderer
+        self.encoder = encoder if isinstance(encoder, ThermalEncoder) else None
+        self.sample_every = max(1, round(1 / sample_rate)) if sample_rate > 0 else 0
+        self.min_module_px = min_module_px
+        self.min_contrast = min_contrast
+        self.issues = []
+        self.notes = []
+        self.checked = 0
+        self.decoded = 0
+        # 已出现内容的摘要存放在临时磁盘数据库中，行数很多时内存占用也不随行数增长
+        self._seen = sqlite3.connect("", check_same_thread=False)
+        self._seen.execute("PRAGMA cache_size=-2048")
+        self._seen.execute("CREATE TABLE seen (digest INTEGER PRIMARY KEY, row INTEGER)")
+        self._queue = queue.Queue(maxsize=1000)
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        
+        # zpl-native 的二维码由打印机按 ^BQ 指令绘制，程序没有对应的图像可解码，只检查 ^BQ 参数
+        self.native_qr = self.encoder is not None and self.encoder.output_format == "zpl-native"
+        if self.native_qr and any(field.display == "qrcode" for field in renderer.fields):
+            self.notes.append((0, "", "未解码", "zpl-native 格式的二维码由打印机按 ^BQ 指令绘制，"
+                                              "未做解码校验，只检查放大倍数和符号尺寸"))
+        
+        if self.encoder is None and any(field.display == "qrcode" for field in renderer.fields):
+            ratio = contrast_ratio(renderer.qr_color, renderer.bg_color)
+            if ratio < min_contrast:
+                self.issues.append((0, "", "对比度不足",
+                                    f"二维码颜色与背景对比度 {ratio:.2f} 低于 {min_contrast}"))
+    
+    def check(self, idx, row):
+        self._queue.put((idx, row))
+    
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            idx, row = item
+            try:
+                self._check_row(idx, row)
+            except Exception as e:
+                self.issues.append((idx + 1, "", "校验出错", str(e)))
+    
+    def _check_row(self, idx, row):
+        self.checked += 1
+        scale = self.encoder.scale if self.encoder is not None else 1.0
+        elements = [e for e in self.renderer.layout(row, scale) if e.kind == "qrcode"]
+        
+        for element in elements:
+            digest = int.from_bytes(hashlib.blake2b(element.content.encode("utf-8"), digest_size=8).digest(),
+                                    "big", signed=True)
+            first = idx
+            if not self._seen.execute("INSERT OR IGNORE INTO seen VALUES (?, ?)", (digest, idx)).rowcount:
+                first = self._seen.execute("SELECT row FROM seen WHERE digest = ?", (digest,)).fetchone()[0]
+            if first != idx:
+                self.issues.append((idx + 1, element.col, "内容重复", f"与第 {first + 1} 行相同: {element.content}"))
+            
+            modules = len(self.renderer.get_qr_matrix(element.content))
+            module_px = element.size / modules
+            if self.native_qr:
+                # 打印机按整数放大倍数绘制，倍数最小为1，内容过长时符号会超出二维码区域
+                module_px = self.encoder.native_qr_geometry(element)[0]
+                if module_px * modules > element.size:
+                    self.issues.append((idx + 1, element.col, "超出区域",
+                                        f"^BQ 符号 {module_px * modules} 点，超过二维码区域 {element.size} 点"))
+            if module_px < self.min_module_px:
+                self.issues.append((idx + 1, element.col, "模块过小",
+                                    f"每个模块 {module_px:.2f} 像素，低于 {self.min_module_px}，"
+                                    f"内容过长或二维码尺寸过小"))
+        
+        if not elements or not self.sample_every or idx % self.sample_every or self.native_qr:
+            return
+        
+        # 抽样：重新渲染该行并从图像中解码二维码
+        if self.encoder is not None:
+            img = self.encoder.render_bitmap(row)[0]
+        else:
+            img = self.renderer.render(row)
+        for element in elements:
+            modules = len(self.renderer.get_qr_matrix(element.content))
+            if self.encoder is not None:
+                # 热敏输出按整数模块尺寸居中绘制
+                box = max(1, element.size // modules)
+                offset = (element.size - box * modules) // 2
+                x, y, size = element.x + offset, element.y + offset, box * modules
+            else:
+                x, y, size = element.x, element.y, element.size
+            try:
+                decoded = decode_qr_matrix(sample_qr_modules(img, x, y, size, modules)).decode("utf-8")
+            except Exception as e:
+                self.issues.append((idx + 1, element.col, "无法解码", str(e)))
+                continue
+            self.decoded += 1
+            if decoded != element.content:
+                self.issues.append((idx + 1, element.col, "解码不一致", f"解码得到: {decoded}"))
+    
+    def finish(self):
+        """等待校验线程处理完所有行，返回问题列表 (行号, 字段, 问题, 详情)"""
+        self._queue.put(None)
+        self._thread.join()
+        self._seen.close()
+        return self.issues
+    
+    def write_report(self, path):
+        # 使用带BOM的UTF-8，方便直接用Excel打开
+        with open(path, "w", encoding="utf-8-sig", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["行号", "字段", "问题", "详情"])
+            writer.writerows(self.notes)
+            writer.writerows(sorted(self.issues, key=lambda issue: issue[0]))
+
+
+def verifier_from_config(renderer, encoder, config):
+    if not config.get('verify_enabled'):
+        return None
+    return LabelVerifier(renderer, encoder,
+                         sample_rate=float(config.get('verify_sample_rate', 0.01)),
+                         min_module_px=float(config.get('verify_min_module_px', 3)),
+                         min_contrast=float(config.get('verify_min_contrast', 3.0)))
+
+
+def finish_verification(verifier, output_folder):
+    """等待校验完成并把问题报告写入输出目录，返回问题列表"""
+    if verifier is None:
+        return []
+    issues = verifier.finish()
+    if os.path.isdir(output_folder):
+        verifier.write_report(os.path.join(output_folder, VERIFY_REPORT_FILE))
+    return issues
+
+
+def read_table(file_path):
+    """读取Excel或CSV数据表"""
+    if file_path.endswith('.csv'):
+        return pd.read_csv(file_path)
+    return pd.read_excel(file_path)
+
+
+def write_labels(df, renderer, encoder, output_folder, printer_target="", on_progress=None, on_error=None,
+                 verifier=None):
+    """把数据表的每一行输出为标签，返回输出位置
+
+    encoder 为 None 时输出PNG，否则按编码器输出SVG或热敏打印指令。
+    on_progress(已完成, 总数) 每行调用一次，on_error(信息) 在某行失败时调用，
+    单行出错不会中断整个任务；打开输出目标失败时抛出 OSError。
+    传入 verifier 时成功输出的行会交给它在后台校验。
+    """
+    total = len(df)
+    os.makedirs(output_folder, exist_ok=True)
+    
+    def write_rows(write_label):
+        for idx, (_, row) in enumerate(df.iterrows()):
+            try:
+                write_label(idx, row)
+            except Exception as e:
+                if on_error is not None:
+                    on_error(f"生成第 {idx+1} 行时出错: {str(e)}")
+            else:
+                if verifier is not None:
+                    verifier.check(idx, row)
+            
+            # 定期检查内存上限
+            if (idx + 1) % 1000 == 0:
+                renderer.over_memory_limit()
+            
+            if on_progress is not None:
+                on_progress(idx + 1, total)
+    
+    if isinstance(encoder, ThermalEncoder):
+        # 热敏打印：未指定打印机时写入输出目录下的指令文件
+        target = printer_target or os.path.join(output_folder, f"labels{encoder.extension}")
+        with PrinterOutput(target, encoder.extension) as printer:
+            write_rows(lambda idx, row: printer.write(encoder.encode(row)))
+        return target
+    
+    if encoder is not None and encoder.output_format == "svg-sheet":
+        # 所有标签写入同一个SVG文档
+        with open(os.path.join(output_folder, "labels.svg"), "w", encoding="utf-8") as f:
+            document = encoder.document(total)
+            f.write(document.header())
+            write_rows(lambda idx, row: f.write(document.label(encoder.prepare(row))))
+            f.write(document.footer())
+    elif encoder is not None:
+        def write_svg(idx, row):
+            with open(os.path.join(output_folder, f"label_{idx+1}{encoder.extension}"), "wb") as f:
+                f.write(encoder.encode(row))
+        write_rows(write_svg)
+    else:
+        # 渲染和PNG编码重叠进行：画布交给保存线程写盘后归还画布池
+        pool = renderer.canvas_pool()
+        saver = ThreadPoolExecutor(max_workers=1, thread_name_prefix="label-save")
+        
+        def save_png(canvas, idx):
+            try:
+                canvas[0].save(os.path.join(output_folder, f"label_{idx+1}.png"))
+            except Exception as e:
+                if on_error is not None:
+                    on_error(f"保存第 {idx+1} 行时出错: {str(e)}")
+            finally:
+                pool.release(canvas)
+        
+        def write_png(idx, row):
+            canvas = pool.acquire()
+            try:
+                renderer.render(row, canvas)
+            except Exception:
+                pool.release(canvas)
+                raise
+            saver.submit(save_png, canvas, idx)
+        
+        write_rows(write_png)
+        saver.shutdown(wait=True)
+    
+    return output_folder
+
+
+def resolve_field_order(config, columns):
+    """保留配置中仍存在的字段顺序，并把数据表中的新列追加到末尾"""
+    custom_fields = config.get('custom_fields', {})
+    field_order = [col for col in config.get('field_order', []) if col in columns or col in custom_fields]
+    field_order += [col for col in columns if col not in field_order]
+    field_order += [col for col in custom_fields if col not in field_order]
+    return field_order
+
+
+def run_label_job(input_path, config, output_dir):
+    """无界面地为一个数据文件生成全部标签，供批量队列在子进程中调用"""
+    start = time.perf_counter()
+    df = read_table(input_path)
+    config = dict(config, field_order=resolve_field_order(config, list(df.columns)))
+    renderer = get_renderer(config)
+    output_format = config.get('output_format', "png")
+    encoder = None if output_format == "png" else encoder_from_config(renderer, config)
+    
+    name = os.path.splitext(os.path.basename(input_path))[0]
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    # 不同目录下的同名文件可能在同一秒开始，先占用一个未使用的目录名，避免互相覆盖
+    base_folder = output_folder = os.path.join(output_dir, f"labels_{name}_{timestamp}")
+    for suffix in itertools.count(2):
+        try:
+            os.makedirs(output_folder)
+            break
+        except FileExistsError:
+            output_folder = f"{base_folder}_{suffix}"
+    errors = []
+    verifier = verifier_from_config(renderer, encoder, config)
+    try:
+        output = write_labels(df, renderer, encoder, output_folder, config.get('printer_target', ""),
+                              on_error=errors.append, verifier=verifier)
+    finally:
+        issues = finish_verification(verifier, output_folder)
+    return {
+        'total': len(df),
+        'errors': len(errors),
+        'first_error': errors[0] if errors else None,
+        'verify_issues': len(issues),
+        'output': output,
+        'seconds': time.perf_counter() - start,
+    }
+
+
+# 批量任务状态
+JOB_QUEUED = "排队中"
+JOB_RUNNING = "运行中"
+JOB_DONE = "已完成"
+JOB_FAILED = "失败"
+
+# 批量队列接受的数据文件扩展名
+TABLE_EXTENSIONS = (".xlsx", ".xls", ".csv")
+
+
+class BatchJob:
+    """批量队列中的一个任务：输入数据文件、配置和输出目录"""
+
+    def __init__(self, job_id, input_path, config, output_dir, priority=0, on_finish=None):
+        self.job_id = job_id
+        self.input_path = input_path
+        self.config = config
+        self.output_dir = output_dir
+        self.priority = priority
+        self.on_finish = on_finish
+        self.status = JOB_QUEUED
+        self.submitted = time.time()
+        self.started = None
+        self.finished = None
+        self.total = 0
+        self.errors = 0
+        self.verify_issues = 0
+        self.output = None
+        self.error = None
+    
+    @property
+    def seconds(self):
+        if self.started is None:
+            return 0.0
+        return (self.finished or time.time()) - self.started
+    
+    @property
+    def labels_per_second(self):
+        return self.total / self.seconds if self.total and self.seconds > 0 else 0.0
+    
+    def to_dict(self):
+        return {
+            'id': self.job_id,
+            'input': self.input_path,
+            'priority': self.priority,
+            'status': self.status,
+            'labels': self.total,
+            'errors': self.errors,
+            'verify_issues': self.verify_issues,
+            'seconds': round(self.seconds, 3),
+            'labels_per_second': round(self.labels_per_second, 3),
+            'output': self.output,
+            'error': self.error,
+        }
+
+
+class JobScheduler:
+    """多文件批量任务调度器
+
+    任务按优先级（数值大的先执行）排队，最多 max_jobs 个任务同时运行，
+    每个任务在共享的进程池中生成标签。
+    """
+
+    def __init__(self, max_jobs=2, use_processes=True):
+        self.max_jobs = max(1, max_jobs)
+        if use_processes:
+            # 统一使用 spawn：工作进程不继承 Tk 和各线程的状态，各平台行为一致
+            self.executor = ProcessPoolExecutor(max_workers=self.max_jobs,
+                                                mp_context=multiprocessing.get_context("spawn"))
+        else:
+            self.executor = ThreadPoolExecutor(max_workers=self.max_jobs, thread_name_prefix="label-job")
+        self.jobs = []
+        self.started = None
+        self._queue = queue.PriorityQueue()
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._dispatchers = [threading.Thread(target=self._dispatch, daemon=True) for _ in range(self.max_jobs)]
+        for thread in self._dispatchers:
+            thread.start()
+    
+    def submit(self, input_path, config, output_dir=None, priority=0, on_finish=None):
+        output_dir = output_dir or config.get('output_dir') or os.getcwd()
+        with self._lock:
+            job = BatchJob(len(self.jobs) + 1, input_path, config, output_dir, priority, on_finish)
+            self.jobs.append(job)
+        self._queue.put((-priority, next(self._seq), job))
+        return job
+    
+    def reject(self, input_path, error, output_dir=None, on_finish=None):
+        """记录一个无法开始的任务（例如配置无效），直接标记为失败"""
+        with self._lock:
+            job = BatchJob(len(self.jobs) + 1, input_path, {}, output_dir or os.getcwd(), on_finish=on_finish)
+            self.jobs.append(job)
+        job.status = JOB_FAILED
+        job.error = error
+        job.finished = time.time()
+        self._finish(job)
+        return job
+    
+    def _finish(self, job):
+        """调用任务完成回调，回调出错只记录，不影响调度"""
+        if job.on_finish is None:
+            return
+        try:
+            job.on_finish(job)
+        except Exception as e:
+            print(f"任务 {job.job_id} ({job.input_path}) 完成回调出错: {e}", file=sys.stderr, flush=True)
+    
+    def _dispatch(self):
+        while True:
+            _, _, job = self._queue.get()
+            if job is None:
+                self._queue.task_done()
+                return
+            
+            # 停止后不再启动新任务，尚未开始的任务保持排队状态，不回调也不移动输入文件
+            with self._lock:
+                if self._stopped.is_set():
+                    self._queue.task_done()
+                    continue
+                if self.started is None:
+                    self.started = time.time()
+                job.status = JOB_RUNNING
+                job.started = time.time()
+                future = self.executor.submit(run_label_job, job.input_path, job.config, job.output_dir)
+            try:
+                result = future.result()
+                job.total = result['total']
+                job.errors = result['errors']
+                job.verify_issues = result['verify_issues']
+                job.output = result['output']
+                job.error = result['first_error']
+                job.status = JOB_DONE
+            except Exception as e:
+                if self._stopped.is_set():
+                    # 停止时被中断的任务视为未完成，恢复为排队状态
+                    job.status = JOB_QUEUED
+                    job.started = None
+                else:
+                    job.error = str(e)
+                    job.status = JOB_FAILED
+            finally:
+                if job.status != JOB_QUEUED:
+                    job.finished = time.time()
+                self._queue.task_done()
+            
+            if job.status == JOB_QUEUED:
+                continue
+            self._finish(job)
+    
+    def watch(self, folder, config, output_dir=None, interval=5.0, on_finish=None):
+        """监视目录中新出现的数据文件并自动加入队列
+
+        文件大小在两次检查间不再变化时才提交，避免处理尚未复制完的文件。
+        同名的 .json 文件作为该文件的配置；处理后的文件移入 done 或 failed 子目录。
+        """
+        sizes = {}
+        submitted = set()
+        
+        def move_done(job):
+            target = os.path.join(folder, "done" if job.status == JOB_DONE else "failed")
+            os.makedirs(target, exist_ok=True)
+            for path in (job.input_path, os.path.splitext(job.input_path)[0] + ".json"):
+                if os.path.exists(path):
+                    shutil.move(path, os.path.join(target, os.path.basename(path)))
+            # 文件已移走，之后出现的同名文件作为新任务处理
+            submitted.discard(job.input_path)
+            sizes.pop(job.input_path, None)
+            if on_finish is not None:
+                on_finish(job)
+        
+        def poll():
+            while not self._stopped.wait(interval):
+                try:
+                    names = sorted(os.listdir(folder))
+                except OSError as e:
+                    print(f"无法读取监视目录 {folder}: {e}", file=sys.stderr, flush=True)
+                    continue
+                for name in names:
+                    path = os.path.join(folder, name)
+                    if not name.lower().endswith(TABLE_EXTENSIONS) or path in submitted or not os.path.isfile(path):
+                        continue
+                    try:
+                        size = os.path.getsize(path)
+                    except OSError:
+                        # 文件在列出后被移走或删除
+                        sizes.pop(path, None)
+                        continue
+                    if sizes.get(path) != size:
+                        sizes[path] = size
+                        continue
+                    submitted.add(path)
+                    # 单个文件的配置出错时只让该文件失败，继续监视
+                    try:
+                        job_config = paired_config(path, config)
+                    except (OSError, ValueError) as e:
+                        self.reject(path, str(e), output_dir, on_finish=move_done)
+                        continue
+                    self.submit(path, job_config, output_dir, on_finish=move_done)
+        
+        thread = threading.Thread(target=poll, daemon=True)
+        thread.start()
+        return thread
+    
+    def join(self):
+        """等待当前队列中的任务全部完成"""
+        self._queue.join()
+    
+    def summary(self):
+        with self._lock:
+            jobs = list(self.jobs)
+            started = self.started
+        labels = sum(job.total for job in jobs)
+        elapsed = time.time() - started if started else 0.0
+        counts = {status: 0 for status in (JOB_QUEUED, JOB_RUNNING, JOB_DONE, JOB_FAILED)}
+        for job in jobs:
+            counts[job.status] += 1
+        return {
+            'jobs': counts,
+            'labels': labels,
+            'seconds': round(elapsed, 3),
+            'labels_per_second': round(labels / elapsed, 3) if elapsed > 0 else 0.0,
+        }
+    
+    def shutdown(self, wait=False):
+        """停止调度，尚未开始的任务保持排队状态；wait 为 True 时等待运行中的任务结束"""
+        with self._lock:
+            self._stopped.set()
+        for _ in self._dispatchers:
+            self._queue.put((float("inf"), next(self._seq), None))
+        self.executor.shutdown(wait=wait, cancel_futures=True)
+
+
+def paired_config(input_path, default_config):
+    """数据文件旁同名的 .json 文件优先作为它的配置"""
+    config_path = os.path.splitext(input_path)[0] + ".json"
+    if os.path.exists(config_path):
+        return read_config_file(config_path)
+    return default_config
+
+
+def read_job_list(path, default_config):
+    """读取任务清单：JSON数组，每项包含 input，可选 config、output、priority"""
+    with open(path, "r", encoding="utf-8") as f:
+        entries = json.load(f)
+    jobs = []
+    for entry in entries:
+        config = read_config_file(entry['config']) if entry.get('config') else paired_config(entry['input'], default_config)
+        jobs.append((entry['input'], config, entry.get('output'), int(entry.get('priority', 0))))
+    return jobs
+
 
 class LabelGeneratorApp:
     def __init__(self, root):
@@ -34,9 +1731,25 @@ class LabelGeneratorApp:
         self.bg_color = self.config.get('bg_color', '#FFFFFF')
         self.text_color = self.config.get('text_color', '#000000')
         self.qr_color = self.config.get('qr_color', '#000000')
+        self.output_format = self.config.get('output_format', 'png')
+        self.printer_dpi = self.config.get('printer_dpi', 203)
+        self.label_width_mm = self.config.get('label_width_mm', '')
+        self.label_height_mm = self.config.get('label_height_mm', '')
+        self.printer_target = self.config.get('printer_target', '')
+        self.memory_limit_mb = self.config.get('memory_limit_mb', 0)
+        self.verify_enabled = tk.BooleanVar(value=self.config.get('verify_enabled', False))
+        self.verify_sample_rate = self.config.get('verify_sample_rate', 0.01)
+        self.verify_min_module_px = self.config.get('verify_min_module_px', 3)
+        self.verify_min_contrast = self.config.get('verify_min_contrast', 3.0)
         self.preview_row = 0
         self.total_rows = 0
         self.custom_fields = {}  # 存储自定义字段内容
+        # 设置了内存上限时，缩略图缓存最多占用其四分之一
+        thumbnail_bytes = THUMBNAIL_CACHE_BYTES
+        if self.memory_limit_mb:
+            thumbnail_bytes = min(thumbnail_bytes, int(self.memory_limit_mb) * 1024 * 1024 // 4)
+        self.thumbnail_cache = ThumbnailCache(thumbnail_bytes)
+        self.data_generation = 0  # 每次导入数据递增，旧数据的缩略图不再命中
         
         # 创建菜单
         self.create_menu()
@@ -52,6 +1765,7 @@ class LabelGeneratorApp:
         file_menu.add_command(label="导入 Excel", command=self.import_excel)
         file_menu.add_command(label="导出配置", command=self.export_config)
         file_menu.add_command(label="导入配置", command=self.import_config)
+        file_menu.add_command(label="批量队列", command=lambda: BatchQueueWindow(self))
         file_menu.add_separator()
         file_menu.add_command(label="退出", command=self.root.quit)
         menubar.add_cascade(label="文件", menu=file_menu)
@@ -71,14 +1785,21 @@ class LabelGeneratorApp:
     def load_config(self):
         self.config = {}
         try:
-            if os.path.exists("label_config.json"):
-                with open("label_config.json", "r") as f:
-                    self.config = json.load(f)
+            self.config = read_config_file(CONFIG_FILE)
+        except ValueError as e:
+            messagebox.showwarning("配置无效", f"{CONFIG_FILE} 未加载: {str(e)}")
         except:
             pass
     
-    def save_config(self):
-        config = {
+    @staticmethod
+    def _field_value(value):
+        """字段设置可能是控件（界面已渲染）或普通值（刚从配置加载）"""
+        return value.get() if hasattr(value, 'get') else value
+    
+    def build_config(self):
+        """把界面上的当前设置整理成配置字典，供保存和渲染使用"""
+        value = self._field_value
+        return {
             'label_width': self.label_width,
             'label_height': self.label_height,
             'qr_size': self.qr_size,
@@ -87,17 +1808,29 @@ class LabelGeneratorApp:
             'text_color': self.text_color,
             'qr_color': self.qr_color,
             'field_order': self.field_order,
-            'field_display_types': {k: v.get() for k, v in self.field_display_types.items()},
-            'field_prefixes': {k: v.get() for k, v in self.field_prefixes.items()},
-            'field_suffixes': {k: v.get() for k, v in self.field_suffixes.items()},
-            'field_font_sizes': {k: v.get() for k, v in self.field_font_sizes.items()},
+            'field_display_types': {k: value(v) for k, v in self.field_display_types.items()},
+            'field_prefixes': {k: value(v) for k, v in self.field_prefixes.items()},
+            'field_suffixes': {k: value(v) for k, v in self.field_suffixes.items()},
+            'field_font_sizes': {k: int(value(v)) for k, v in self.field_font_sizes.items()},
             'field_colors': {k: v for k, v in self.field_colors.items()},
-            'custom_fields': self.custom_fields
+            'custom_fields': dict(self.custom_fields),
+            'output_format': self.output_format_combo.get(),
+            'printer_dpi': int(self.printer_dpi_combo.get()),
+            'label_width_mm': self.width_mm_entry.get(),
+            'label_height_mm': self.height_mm_entry.get(),
+            'printer_target': self.printer_target_entry.get(),
+            'memory_limit_mb': int(self.memory_limit_entry.get()) if self.memory_limit_entry.get().strip().isdigit() else 0,
+            'verify_enabled': self.verify_enabled.get(),
+            'verify_sample_rate': float(self.verify_sample_spin.get()),
+            'verify_min_module_px': self.verify_min_module_px,
+            'verify_min_contrast': self.verify_min_contrast
         }
+    
+    def save_config(self):
+        config = self.build_config()
         
         try:
-            with open("label_config.json", "w") as f:
-                json.dump(config, f, indent=4)
+            write_config_file(config, CONFIG_FILE)
         except Exception as e:
             messagebox.showerror("保存配置失败", f"错误: {str(e)}")
     
@@ -242,6 +1975,52 @@ class LabelGeneratorApp:
         self.output_dir_label.pack(side="left", padx=5, fill="x", expand=True)
         ttk.Button(output_frame, text="浏览", command=self.set_output_dir).pack(side="left", padx=5)
         
+        ttk.Label(output_frame, text="内存上限(MB):").pack(side="left", padx=(10, 0))
+        self.memory_limit_entry = ttk.Entry(output_frame, width=6)
+        self.memory_limit_entry.insert(0, str(self.memory_limit_mb or ""))
+        self.memory_limit_entry.pack(side="left", padx=5)
+        
+        # 打印输出
+        printer_frame = ttk.Frame(label_config_frame)
+        printer_frame.pack(fill="x", pady=5)
+        
+        ttk.Label(printer_frame, text="输出格式:").grid(row=0, column=0, padx=5, sticky="e")
+        self.output_format_combo = ttk.Combobox(printer_frame, values=["png"] + list(SVG_FORMATS) + list(THERMAL_FORMATS),
+                                                width=10, state="readonly")
+        self.output_format_combo.set(self.output_format)
+        self.output_format_combo.grid(row=0, column=1, padx=5, sticky="w")
+        
+        ttk.Label(printer_frame, text="DPI:").grid(row=0, column=2, padx=5, sticky="e")
+        self.printer_dpi_combo = ttk.Combobox(printer_frame, values=[203, 300, 600], width=5, state="readonly")
+        self.printer_dpi_combo.set(str(self.printer_dpi))
+        self.printer_dpi_combo.grid(row=0, column=3, padx=5, sticky="w")
+        
+        ttk.Label(printer_frame, text="宽(mm):").grid(row=0, column=4, padx=5, sticky="e")
+        self.width_mm_entry = ttk.Entry(printer_frame, width=6)
+        self.width_mm_entry.insert(0, str(self.label_width_mm))
+        self.width_mm_entry.grid(row=0, column=5, padx=5, sticky="w")
+        
+        ttk.Label(printer_frame, text="高(mm):").grid(row=0, column=6, padx=5, sticky="e")
+        self.height_mm_entry = ttk.Entry(printer_frame, width=6)
+        self.height_mm_entry.insert(0, str(self.label_height_mm))
+        self.height_mm_entry.grid(row=0, column=7, padx=5, sticky="w")
+        
+        ttk.Label(printer_frame, text="打印机:").grid(row=1, column=0, padx=5, pady=(5, 0), sticky="e")
+        self.printer_target_entry = ttk.Entry(printer_frame, width=40)
+        self.printer_target_entry.insert(0, self.printer_target)
+        self.printer_target_entry.grid(row=1, column=1, columnspan=7, padx=5, pady=(5, 0), sticky="we")
+        
+        # 生成时校验
+        verify_frame = ttk.Frame(label_config_frame)
+        verify_frame.pack(fill="x", pady=5)
+        
+        ttk.Checkbutton(verify_frame, text="生成时校验二维码", variable=self.verify_enabled).pack(side="left")
+        ttk.Label(verify_frame, text="解码抽样比例:").pack(side="left", padx=(20, 5))
+        self.verify_sample_spin = ttk.Spinbox(verify_frame, values=("0", "0.001", "0.01", "0.1", "1"), width=6,
+                                              state="readonly")
+        self.verify_sample_spin.set(str(self.verify_sample_rate))
+        self.verify_sample_spin.pack(side="left")
+        
         # 预览行选择
         preview_frame = ttk.Frame(label_config_frame)
         preview_frame.pack(fill="x", pady=5)
@@ -267,6 +2046,7 @@ class LabelGeneratorApp:
         btn_frame.pack(fill="x", pady=10)
         ttk.Button(btn_frame, text="生成标签", command=self.start_generation).pack(side="left", padx=5)
         ttk.Button(btn_frame, text="保存配置", command=self.save_config).pack(side="left", padx=5)
+        ttk.Button(btn_frame, text="页面预览", command=self.open_sheet_preview).pack(side="left", padx=5)
         
         # 右侧预览区域
         preview_container = ttk.Frame(main_frame, width=500)
@@ -344,10 +2124,9 @@ class LabelGeneratorApp:
         )
         if file_path:
             try:
-                if file_path.endswith('.csv'):
-                    self.df = pd.read_csv(file_path)
-                else:
-                    self.df = pd.read_excel(file_path)
+                self.df = read_table(file_path)
+                self.data_generation += 1
+                self.thumbnail_cache.clear()
                 
                 self.file_label.config(text=os.path.basename(file_path))
                 self.total_rows = len(self.df)
@@ -380,51 +2159,31 @@ class LabelGeneratorApp:
                 self.update_status(f"导入失败: {str(e)}")
     
     def load_field_config(self):
-        # 如果配置中有字段设置，则加载
+        # 配置中的字段设置以普通值加载，控件在 _render_field_config 中统一创建
         if 'field_order' in self.config:
-            # 只保留当前数据集中存在的字段
-            self.field_order = [col for col in self.config['field_order'] if col in self.df.columns or col in self.custom_fields]
-            # 添加新字段到末尾
-            for col in self.df.columns:
-                if col not in self.field_order:
-                    self.field_order.append(col)
-            
-            # 添加自定义字段
             if 'custom_fields' in self.config:
-                self.custom_fields = self.config['custom_fields']
-                for col in self.custom_fields:
-                    if col not in self.field_order:
-                        self.field_order.append(col)
-        
-        # 加载字段显示类型
-        if 'field_display_types' in self.config:
-            for col, display_type in self.config['field_display_types'].items():
-                if col in self.df.columns or col in self.custom_fields:
-                    self.field_display_types[col] = tk.StringVar(value=display_type)
-        
-        # 加载前后缀和字体大小
-        for field_dict, config_key in [(self.field_prefixes, 'field_prefixes'), 
-                                      (self.field_suffixes, 'field_suffixes'),
-                                      (self.field_font_sizes, 'field_font_sizes')]:
-            if config_key in self.config:
-                for col, value in self.config[config_key].items():
-                    if col in self.df.columns or col in self.custom_fields:
-                        if config_key == 'field_font_sizes':
-                            self.field_font_sizes[col] = value
-                        else:
-                            # 对于前缀和后缀，创建Entry控件
-                            entry = ttk.Entry()
-                            entry.insert(0, value)
-                            if config_key == 'field_prefixes':
-                                self.field_prefixes[col] = entry
-                            else:
-                                self.field_suffixes[col] = entry
-        
-        # 加载字段颜色
-        if 'field_colors' in self.config:
-            for col, color in self.config['field_colors'].items():
-                if col in self.df.columns or col in self.custom_fields:
-                    self.field_colors[col] = color
+                self.custom_fields = dict(self.config['custom_fields'])
+            # 只保留当前数据集中存在的字段，新字段添加到末尾
+            self.field_order = resolve_field_order(dict(self.config, custom_fields=self.custom_fields),
+                                                   list(self.df.columns))
+        
+        for field in field_specs(dict(self.config, field_order=self.field_order)):
+            if field.name not in self.config.get('field_display_types', {}):
+                continue
+            self.field_display_types[field.name] = field.display
+            self.field_prefixes[field.name] = field.prefix
+            self.field_suffixes[field.name] = field.suffix
+            self.field_font_sizes[field.name] = field.font_size
+            if field.color is not None:
+                self.field_colors[field.name] = field.color
+    
+    def _clear_field_widgets(self):
+        """销毁字段配置控件，并把其中的当前值保存为普通值，以便重新渲染"""
+        for field_dict in (self.field_display_types, self.field_prefixes, self.field_suffixes, self.field_font_sizes):
+            for col, value in field_dict.items():
+                field_dict[col] = self._field_value(value)
+        for widget in self.field_scrollable_frame.winfo_children():
+            widget.destroy()
     
     def _render_field_config(self):
         # 填充字段列表
@@ -443,7 +2202,7 @@ class LabelGeneratorApp:
             ttk.Label(frame, text=label_text, width=15, anchor="e").pack(side="left")
             
             # 展示形式
-            var = self.field_display_types.get(col, tk.StringVar(value="text"))
+            var = tk.StringVar(value=self._field_value(self.field_display_types.get(col, "text")))
             self.field_display_types[col] = var
             rb_frame = ttk.Frame(frame)
             rb_frame.pack(side="left", padx=5)
@@ -454,21 +2213,15 @@ class LabelGeneratorApp:
             
             # 前置内容
             ttk.Label(frame, text="前缀:").pack(side="left", padx=(10, 0))
-            prefix_entry = self.field_prefixes.get(col, ttk.Entry(frame, width=8))
-            if not isinstance(prefix_entry, ttk.Entry):
-                entry = ttk.Entry(frame, width=8)
-                entry.insert(0, prefix_entry)
-                prefix_entry = entry
+            prefix_entry = ttk.Entry(frame, width=8)
+            prefix_entry.insert(0, self._field_value(self.field_prefixes.get(col, "")))
             prefix_entry.pack(side="left", padx=2)
             self.field_prefixes[col] = prefix_entry
             
             # 后置内容
             ttk.Label(frame, text="后缀:").pack(side="left", padx=(10, 0))
-            suffix_entry = self.field_suffixes.get(col, ttk.Entry(frame, width=8))
-            if not isinstance(suffix_entry, ttk.Entry):
-                entry = ttk.Entry(frame, width=8)
-                entry.insert(0, suffix_entry)
-                suffix_entry = entry
+            suffix_entry = ttk.Entry(frame, width=8)
+            suffix_entry.insert(0, self._field_value(self.field_suffixes.get(col, "")))
             suffix_entry.pack(side="left", padx=2)
             self.field_suffixes[col] = suffix_entry
             
@@ -482,7 +2235,7 @@ class LabelGeneratorApp:
             
             # 字体大小
             ttk.Label(frame, text="字体:").pack(side="left", padx=(10, 0))
-            font_size_value = self.field_font_sizes.get(col, "16")
+            font_size_value = self._field_value(self.field_font_sizes.get(col, 16))
             font_size_combo = ttk.Combobox(frame, values=[8, 10, 12, 14, 16, 18, 20, 24, 28, 32], width=4, state="readonly")
             font_size_combo.set(str(font_size_value))
             font_size_combo.pack(side="left", padx=2)
@@ -494,10 +2247,6 @@ class LabelGeneratorApp:
                                  command=lambda c=col: self.choose_field_color(c))
             color_btn.pack(side="left", padx=(10, 0))
             
-            # 设置默认颜色
-            if col not in self.field_colors:
-                self.field_colors[col] = self.text_color
-            
             # 绑定事件
             prefix_entry.bind("<KeyRelease>", lambda e, col=col: self.update_preview())
             suffix_entry.bind("<KeyRelease>", lambda e, col=col: self.update_preview())
@@ -580,8 +2329,7 @@ class LabelGeneratorApp:
             self.update_field_list()
             
             # 重新渲染字段配置
-            for widget in self.field_scrollable_frame.winfo_children():
-                widget.destroy()
+            self._clear_field_widgets()
             self._render_field_config()
             
             self.update_status(f"已删除字段: {field_name}")
@@ -605,8 +2353,7 @@ class LabelGeneratorApp:
             self.update_field_list()
             
             # 重新渲染字段配置
-            for widget in self.field_scrollable_frame.winfo_children():
-                widget.destroy()
+            self._clear_field_widgets()
             self._render_field_config()
             
             self.update_status(f"已添加自定义字段: {field_name}")
@@ -636,68 +2383,65 @@ class LabelGeneratorApp:
         self.progress['value'] = 0
         self.update_status("正在生成标签...")
         
-        # 使用线程生成标签，避免界面冻结
-        threading.Thread(target=self.generate_labels, daemon=True).start()
+        # 在主线程读取界面设置，再交给线程渲染，避免界面冻结
+        config = self.build_config()
+        renderer = get_renderer(config)
+        encoder = None
+        if config['output_format'] != "png":
+            try:
+                encoder = encoder_from_config(renderer, config)
+                if config['printer_target'].startswith("tcp://"):
+                    parse_printer_address(config['printer_target'])
+            except ValueError as e:
+                messagebox.showerror("错误", f"输出设置无效: {str(e)}")
+                return
+        verifier = verifier_from_config(renderer, encoder, config)
+        threading.Thread(target=self.generate_labels, args=(renderer, encoder, config['printer_target'], verifier),
+                         daemon=True).start()
     
-    def generate_labels(self):
+    def generate_labels(self, renderer, encoder=None, printer_target="", verifier=None):
         total = len(self.df)
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         output_folder = os.path.join(self.output_dir, f"labels_{timestamp}")
-        os.makedirs(output_folder, exist_ok=True)
         
-        for idx, row in self.df.iterrows():
-            try:
-                img = Image.new('RGB', (self.label_width, self.label_height), color=self.bg_color)
-                draw = ImageDraw.Draw(img)
-                current_y = 20
-                
-                for col in self.field_order:
-                    # 获取字段内容
-                    if col in self.custom_fields:
-                        content = self.custom_fields[col]  # 自定义字段内容
-                    else:
-                        content = str(row[col])  # Excel数据内容
-                    
-                    prefix = self.field_prefixes[col].get()
-                    suffix = self.field_suffixes[col].get()
-                    full_content = f"{prefix}{content}{suffix}"
-                    
-                    if self.field_display_types[col].get() == "qrcode":
-                        qr = qrcode.QRCode(version=1, box_size=5, border=2)
-                        qr.add_data(full_content)
-                        qr.make(fit=True)
-                        
-                        # 创建彩色二维码
-                        qr_img = qr.make_image(fill_color=self.qr_color, back_color=self.bg_color)
-                        qr_img = qr_img.resize((self.qr_size, self.qr_size))
-                        x = (self.label_width - self.qr_size) // 2
-                        img.paste(qr_img, (x, current_y))
-                        current_y += self.qr_size + 20
-                    else:
-                        font_size = int(self.field_font_sizes[col].get())
-                        try:
-                            font = ImageFont.truetype("msyh.ttc", font_size)
-                        except:
-                            font = ImageFont.load_default()
-                        
-                        text_color = self.field_colors.get(col, self.text_color)
-                        text_width = draw.textlength(full_content, font=font)
-                        x = (self.label_width - text_width) // 2
-                        draw.text((x, current_y), full_content, fill=text_color, font=font)
-                        current_y += font_size + 10
-                
-                # 保存标签
-                img.save(os.path.join(output_folder, f"label_{idx+1}.png"))
-                
-                # 更新进度
-                progress = (idx + 1) / total * 100
+        # 进度和错误信息按固定频率刷新到界面
+        last_update = 0.0
+        last_error = None
+        
+        def on_error(message):
+            nonlocal last_error
+            last_error = message
+        
+        def on_progress(done, total):
+            nonlocal last_update, last_error
+            now = time.monotonic()
+            if now - last_update >= PROGRESS_INTERVAL or done == total:
+                last_update = now
+                progress = done / total * 100
                 self.root.after(10, lambda v=progress: self.progress.configure(value=v))
-                
-            except Exception as e:
-                self.root.after(10, lambda e=e: self.update_status(f"生成第 {idx+1} 行时出错: {str(e)}"))
+                if last_error is not None:
+                    self.root.after(10, lambda m=last_error: self.update_status(m))
+                    last_error = None
         
+        report_folder = output_folder
+        try:
+            output_folder = write_labels(self.df, renderer, encoder, output_folder, printer_target,
+                                         on_progress, on_error, verifier)
+        except (OSError, ValueError) as e:
+            self.root.after(10, lambda e=e: self.update_status(f"输出失败: {str(e)}"))
+            self.root.after(10, lambda e=e: messagebox.showerror("输出失败", f"错误: {str(e)}"))
+            return
+        finally:
+            if verifier is not None:
+                self.root.after(10, lambda: self.update_status("正在完成校验..."))
+            issues = finish_verification(verifier, report_folder)
+        
+        message = f"已生成 {total} 个标签到:\n{output_folder}"
+        if verifier is not None:
+            report = os.path.join(report_folder, VERIFY_REPORT_FILE)
+            message += f"\n\n校验发现 {len(issues)} 个问题，报告: {report}" if issues else "\n\n校验未发现问题"
         self.root.after(10, lambda: self.update_status(f"成功生成 {total} 个标签到: {output_folder}"))
-        self.root.after(10, lambda: messagebox.showinfo("完成", f"已生成 {total} 个标签到:\n{output_folder}"))
+        self.root.after(10, lambda: messagebox.showinfo("完成", message))
     
     def update_preview(self, event=None):
         if self.df is None or not self.field_order:
@@ -712,42 +2456,12 @@ class LabelGeneratorApp:
             self.preview_row = row_idx
             sample_row = self.df.iloc[row_idx] if self.df is not None else {}
             
-            img = Image.new('RGB', (self.label_width, self.label_height), color=self.bg_color)
-            draw = ImageDraw.Draw(img)
-            current_y = 20
-            
-            for col in self.field_order:
-                # 获取字段内容
-                if col in self.custom_fields:
-                    content = self.custom_fields[col]  # 自定义字段内容
-                else:
-                    content = str(sample_row.get(col, ""))  # Excel数据内容
-                
-                prefix = self.field_prefixes[col].get()
-                suffix = self.field_suffixes[col].get()
-                full_content = f"{prefix}{content}{suffix}"
-                
-                if self.field_display_types.get(col, tk.StringVar(value="text")).get() == "qrcode":
-                    qr = qrcode.QRCode(version=1, box_size=5, border=2)
-                    qr.add_data(full_content)
-                    qr.make(fit=True)
-                    qr_img = qr.make_image(fill_color=self.qr_color, back_color=self.bg_color)
-                    qr_img = qr_img.resize((self.qr_size, self.qr_size))
-                    x = (self.label_width - self.qr_size) // 2
-                    img.paste(qr_img, (x, current_y))
-                    current_y += self.qr_size + 20
-                else:
-                    try:
-                        font_size = int(self.field_font_sizes[col].get())
-                        font = ImageFont.truetype("msyh.ttc", font_size)
-                    except:
-                        font = ImageFont.load_default()
-                    
-                    text_color = self.field_colors.get(col, self.text_color)
-                    text_width = draw.textlength(full_content, font=font)
-                    x = (self.label_width - text_width) // 2
-                    draw.text((x, current_y), full_content, fill=text_color, font=font)
-                    current_y += font_size + 10
+            renderer, version = self.preview_renderer()
+            key = (row_idx, version, 1.0)
+            img = self.thumbnail_cache.get(key)
+            if img is None:
+                img = renderer.render(sample_row)
+                self.thumbnail_cache.put(key, img)
             
             # 添加边框
             border_img = Image.new('RGB', (self.label_width + 20, self.label_height + 20), color="#f0f0f0")
@@ -766,6 +2480,17 @@ class LabelGeneratorApp:
         except Exception as e:
             self.update_status(f"预览错误: {str(e)}")
     
+    def preview_renderer(self):
+        """返回预览用的渲染器和版本（数据代次与布局版本），布局未变化时复用渲染器及其缓存"""
+        config = self.build_config()
+        return get_renderer(config), (self.data_generation, layout_version(config))
+    
+    def open_sheet_preview(self):
+        if self.df is None or not self.field_order:
+            messagebox.showerror("错误", "请先导入Excel文件！")
+            return
+        SheetPreviewWindow(self)
+    
     def export_config(self):
         file_path = filedialog.asksaveasfilename(
             defaultextension=".json",
@@ -774,8 +2499,7 @@ class LabelGeneratorApp:
         if file_path:
             self.save_config()
             try:
-                with open("label_config.json", "r") as src, open(file_path, "w") as dst:
-                    dst.write(src.read())
+                write_config_file(self.build_config(), file_path)
                 self.update_status(f"配置已导出到: {file_path}")
             except Exception as e:
                 messagebox.showerror("导出错误", f"导出失败: {str(e)}")
@@ -786,8 +2510,7 @@ class LabelGeneratorApp:
         )
         if file_path:
             try:
-                with open(file_path, "r") as f:
-                    self.config = json.load(f)
+                self.config = read_config_file(file_path)
                 
                 # 应用配置
                 self.label_width = self.config.get('label_width', 300)
@@ -798,6 +2521,16 @@ class LabelGeneratorApp:
                 self.text_color = self.config.get('text_color', '#000000')
                 self.qr_color = self.config.get('qr_color', '#000000')
                 self.custom_fields = self.config.get('custom_fields', {})
+                self.output_format = self.config.get('output_format', 'png')
+                self.printer_dpi = self.config.get('printer_dpi', 203)
+                self.label_width_mm = self.config.get('label_width_mm', '')
+                self.label_height_mm = self.config.get('label_height_mm', '')
+                self.printer_target = self.config.get('printer_target', '')
+                self.memory_limit_mb = self.config.get('memory_limit_mb', 0)
+                self.verify_enabled.set(self.config.get('verify_enabled', False))
+                self.verify_sample_rate = self.config.get('verify_sample_rate', 0.01)
+                self.verify_min_module_px = self.config.get('verify_min_module_px', 3)
+                self.verify_min_contrast = self.config.get('verify_min_contrast', 3.0)
                 
                 # 更新UI
                 self.width_entry.delete(0, tk.END)
@@ -807,10 +2540,22 @@ class LabelGeneratorApp:
                 self.qr_size_entry.delete(0, tk.END)
                 self.qr_size_entry.insert(0, str(self.qr_size))
                 self.output_dir_label.config(text=self.output_dir)
+                self.output_format_combo.set(self.output_format)
+                self.printer_dpi_combo.set(str(self.printer_dpi))
+                self.width_mm_entry.delete(0, tk.END)
+                self.width_mm_entry.insert(0, str(self.label_width_mm))
+                self.height_mm_entry.delete(0, tk.END)
+                self.height_mm_entry.insert(0, str(self.label_height_mm))
+                self.printer_target_entry.delete(0, tk.END)
+                self.printer_target_entry.insert(0, self.printer_target)
+                self.memory_limit_entry.delete(0, tk.END)
+                self.memory_limit_entry.insert(0, str(self.memory_limit_mb or ""))
+                self.verify_sample_spin.set(str(self.verify_sample_rate))
                 self.update_color_buttons()
                 
                 # 如果有数据，重新渲染字段配置
                 if self.df is not None:
+                    self._clear_field_widgets()
                     self.load_field_config()
                     self._render_field_config()
                     self.update_preview()
@@ -842,7 +2587,605 @@ class LabelGeneratorApp:
     def update_status(self, message):
         self.status_label.config(text=message)
 
-if __name__ == "__main__":
+class SheetPreviewWindow:
+    """页面预览：按打印纸的行列排版显示多个标签缩略图
+
+    缩略图在后台线程中按缩小比例渲染，结果存入应用的缩略图缓存，
+    翻页时只渲染尚未缓存的标签，并预取下一页。
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.renderer, self.version = app.preview_renderer()
+        self.page = 0
+        self.token = 0
+        self.photos = {}
+        self.cells = {}
+        self.requests = queue.Queue()
+        
+        self.top = tk.Toplevel(app.root)
+        self.top.title("页面预览")
+        self.top.geometry("900x800")
+        self.top.protocol("WM_DELETE_WINDOW", self.close)
+        
+        controls = ttk.Frame(self.top, padding=5)
+        controls.pack(fill="x")
+        
+        ttk.Label(controls, text="每页列数:").pack(side="left")
+        self.columns_spin = ttk.Spinbox(controls, from_=1, to=20, width=4, command=self.refresh)
+        self.columns_spin.set(4)
+        self.columns_spin.pack(side="left", padx=5)
+        
+        ttk.Label(controls, text="每页行数:").pack(side="left")
+        self.rows_spin = ttk.Spinbox(controls, from_=1, to=20, width=4, command=self.refresh)
+        self.rows_spin.set(4)
+        self.rows_spin.pack(side="left", padx=5)
+        
+        ttk.Label(controls, text="缩放:").pack(side="left")
+        self.scale_combo = ttk.Combobox(controls, values=["0.25", "0.33", "0.5", "0.75"], width=5, state="readonly")
+        self.scale_combo.set("0.33")
+        self.scale_combo.pack(side="left", padx=5)
+        self.scale_combo.bind("<<ComboboxSelected>>", lambda e: self.refresh())
+        
+        ttk.Button(controls, text="下一页", command=lambda: self.change_page(1)).pack(side="right", padx=2)
+        ttk.Button(controls, text="上一页", command=lambda: self.change_page(-1)).pack(side="right", padx=2)
+        self.page_label = ttk.Label(controls, text="")
+        self.page_label.pack(side="right", padx=10)
+        
+        self.canvas = tk.Canvas(self.top, bg="#d0d0d0", highlightthickness=0)
+        self.canvas.pack(fill="both", expand=True)
+        self.canvas.bind("<MouseWheel>", lambda e: self.change_page(-1 if e.delta > 0 else 1))
+        self.canvas.bind("<Button-4>", lambda e: self.change_page(-1))
+        self.canvas.bind("<Button-5>", lambda e: self.change_page(1))
+        self.canvas.bind("<Double-Button-1>", self.select_label)
+        self.top.bind("<Prior>", lambda e: self.change_page(-1))
+        self.top.bind("<Next>", lambda e: self.change_page(1))
+        self.top.bind("<Configure>", lambda e: self.draw_page() if e.widget is self.top else None)
+        
+        threading.Thread(target=self._render_worker, daemon=True).start()
+        self.refresh()
+    
+    @property
+    def per_page(self):
+        return self.columns * self.rows
+    
+    def refresh(self):
+        try:
+            self.columns = max(1, int(self.columns_spin.get()))
+            self.rows = max(1, int(self.rows_spin.get()))
+            self.scale = float(self.scale_combo.get())
+        except ValueError:
+            return
+        # 主窗口中的布局可能已修改
+        self.renderer, self.version = self.app.preview_renderer()
+        self.page = min(self.page, self.page_count() - 1)
+        self.draw_page()
+    
+    def page_count(self):
+        return max(1, (len(self.app.df) + self.per_page - 1) // self.per_page)
+    
+    def change_page(self, step):
+        page = max(0, min(self.page_count() - 1, self.page + step))
+        if page != self.page:
+            self.page = page
+            self.draw_page()
+    
+    def draw_page(self):
+        """绘制当前页的纸张和标签位置，已缓存的缩略图直接显示，其余交给后台渲染"""
+        # 作废尚未处理的旧请求
+        self.token += 1
+        self.canvas.delete("all")
+        self.photos = {}
+        self.cells = {}
+        
+        gap = 8
+        cell_w = round(self.renderer.label_width * self.scale)
+        cell_h = round(self.renderer.label_height * self.scale)
+        sheet_w = self.columns * cell_w + (self.columns + 1) * gap
+        sheet_h = self.rows * cell_h + (self.rows + 1) * gap
+        left = max(10, (self.canvas.winfo_width() - sheet_w) // 2)
+        top = 10
+        self.canvas.create_rectangle(left, top, left + sheet_w, top + sheet_h, fill="white", outline="#808080")
+        
+        # 后台线程只使用请求中带的渲染器、版本和缩放比例，不读取随时可能被 refresh 修改的属性
+        context = (self.renderer, self.version, self.scale, self.app.df)
+        first = self.page * self.per_page
+        last = min(len(self.app.df), first + self.per_page)
+        for idx in range(first, last):
+            slot = idx - first
+            x = left + gap + (slot % self.columns) * (cell_w + gap)
+            y = top + gap + (slot // self.columns) * (cell_h + gap)
+            self.cells[idx] = (x, y)
+            self.canvas.create_rectangle(x, y, x + cell_w, y + cell_h, outline="#c0c0c0", dash=(2, 2))
+            
+            img = self.app.thumbnail_cache.get((idx, self.version, self.scale))
+            if img is not None:
+                self._show(idx, img)
+            else:
+                self.requests.put((self.token, idx, context))
+        
+        # 预取下一页
+        for idx in range(last, min(len(self.app.df), last + self.per_page)):
+            self.requests.put((self.token, idx, context))
+        
+        self.page_label.config(text=f"第 {self.page + 1} / {self.page_count()} 页，第 {first + 1}-{last} 行")
+    
+    def _show(self, idx, img):
+        x, y = self.cells[idx]
+        photo = ImageTk.PhotoImage(img)
+        self.photos[idx] = photo
+        self.canvas.create_image(x, y, image=photo, anchor="nw")
+        self.canvas.create_text(x + 3, y + 2, text=str(idx + 1), anchor="nw", fill="#808080", font=("Arial", 8))
+    
+    def _render_worker(self):
+        while True:
+            request = self.requests.get()
+            if request is None:
+                return
+            token, idx, (renderer, version, scale, df) = request
+            if token != self.token:
+                continue
+            
+            key = (idx, version, scale)
+            if key not in self.app.thumbnail_cache:
+                try:
+                    img = renderer.render(df.iloc[idx], scale=scale)
+                except Exception:
+                    continue
+                self.app.thumbnail_cache.put(key, img)
+            else:
+                img = self.app.thumbnail_cache.get(key)
+            
+            if img is not None:
+                self.app.root.after(0, self._place, token, idx, img)
+    
+    def _place(self, token, idx, img):
+        # 页面已切换或窗口已关闭时丢弃
+        if token == self.token and idx in self.cells:
+            self._show(idx, img)
+    
+    def select_label(self, event):
+        """双击缩略图时在主预览中显示该行"""
+        x, y = self.canvas.canvasx(event.x), self.canvas.canvasy(event.y)
+        cell_w = round(self.renderer.label_width * self.scale)
+        cell_h = round(self.renderer.label_height * self.scale)
+        for idx, (cx, cy) in self.cells.items():
+            if cx <= x <= cx + cell_w and cy <= y <= cy + cell_h:
+                self.app.preview_spin.set(idx + 1)
+                self.app.update_preview()
+                return
+    
+    def close(self):
+        self.token += 1
+        self.cells = {}
+        self.requests.put(None)
+        self.top.destroy()
+
+
+class BatchQueueWindow:
+    """批量队列窗口：添加多个数据文件，按当前界面配置排队生成并显示各任务状态"""
+
+    def __init__(self, app):
+        self.app = app
+        self.scheduler = JobScheduler(max_jobs=max(1, (os.cpu_count() or 2) // 2))
+        
+        self.top = tk.Toplevel(app.root)
+        self.top.title("批量队列")
+        self.top.geometry("900x400")
+        self.top.protocol("WM_DELETE_WINDOW", self.close)
+        
+        controls = ttk.Frame(self.top, padding=5)
+        controls.pack(fill="x")
+        ttk.Button(controls, text="添加文件", command=self.add_files).pack(side="left", padx=2)
+        ttk.Label(controls, text="优先级:").pack(side="left", padx=(10, 0))
+        self.priority_spin = ttk.Spinbox(controls, from_=-10, to=10, width=4)
+        self.priority_spin.set(0)
+        self.priority_spin.pack(side="left", padx=5)
+        self.summary_label = ttk.Label(controls, text="")
+        self.summary_label.pack(side="right", padx=10)
+        
+        columns = ("file", "priority", "status", "labels", "seconds", "rate")
+        self.tree = ttk.Treeview(self.top, columns=columns, show="headings")
+        for col, text, width in [("file", "文件", 320), ("priority", "优先级", 60), ("status", "状态", 80),
+                                 ("labels", "标签数", 80), ("seconds", "耗时(秒)", 80), ("rate", "个/秒", 80)]:
+            self.tree.heading(col, text=text)
+            self.tree.column(col, width=width, anchor="w" if col == "file" else "center")
+        self.tree.pack(fill="both", expand=True, padx=5, pady=5)
+        
+        self.refresh()
+    
+    def add_files(self):
+        file_paths = filedialog.askopenfilenames(
+            filetypes=[("Excel 文件", "*.xlsx *.xls"), ("CSV 文件", "*.csv"), ("所有文件", "*.*")]
+        )
+        if not file_paths:
+            return
+        try:
+            priority = int(self.priority_spin.get())
+        except ValueError:
+            priority = 0
+        config = self.app.build_config()
+        for file_path in file_paths:
+            self.scheduler.submit(file_path, paired_config(file_path, config), self.app.output_dir, priority)
+        self.app.update_status(f"已加入批量队列: {len(file_paths)} 个文件")
+    
+    def refresh(self):
+        for job in self.scheduler.jobs:
+            values = (job.input_path, job.priority, job.status, job.total,
+                      f"{job.seconds:.1f}", f"{job.labels_per_second:.1f}")
+            iid = str(job.job_id)
+            if self.tree.exists(iid):
+                self.tree.item(iid, values=values)
+            else:
+                self.tree.insert("", tk.END, iid=iid, values=values)
+        
+        summary = self.scheduler.summary()
+        jobs = summary['jobs']
+        self.summary_label.config(text=f"排队 {jobs[JOB_QUEUED]}  运行 {jobs[JOB_RUNNING]}  完成 {jobs[JOB_DONE]}  "
+                                       f"失败 {jobs[JOB_FAILED]}  {summary['labels_per_second']:.1f} 个/秒")
+        self.after_id = self.top.after(500, self.refresh)
+    
+    def close(self):
+        self.top.after_cancel(self.after_id)
+        self.scheduler.shutdown()
+        self.top.destroy()
+
+
+CONTENT_TYPES = {
+    "png": "image/png",
+    "svg": "image/svg+xml",
+    "svg-sheet": "image/svg+xml",
+}
+
+
+class ServerMetrics:
+    """记录渲染服务的请求数、标签数和延迟分布"""
+
+    def __init__(self, window=2000):
+        self.started = time.monotonic()
+        self.requests = 0
+        self.errors = 0
+        self.rejected = 0
+        self.labels = 0
+        self.in_flight = 0
+        self._latencies = deque(maxlen=window)
+        self._lock = threading.Lock()
+    
+    def begin(self):
+        with self._lock:
+            self.in_flight += 1
+    
+    def end(self, latency, labels=0, error=False):
+        with self._lock:
+            self.in_flight -= 1
+            self.requests += 1
+            self.labels += labels
+            if error:
+                self.errors += 1
+            self._latencies.append(latency)
+    
+    def reject(self):
+        with self._lock:
+            self.rejected += 1
+    
+    def snapshot(self):
+        with self._lock:
+            uptime = time.monotonic() - self.started
+            latencies = sorted(self._latencies)
+            snapshot = {
+                'uptime_seconds': round(uptime, 3),
+                'requests': self.requests,
+                'errors': self.errors,
+                'rejected': self.rejected,
+                'in_flight': self.in_flight,
+                'labels': self.labels,
+                'labels_per_second': round(self.labels / uptime, 3) if uptime > 0 else 0.0,
+            }
+        
+        def percentile(p):
+            if not latencies:
+                return 0.0
+            return round(latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000, 3)
+        
+        snapshot['latency_ms'] = {
+            'p50': percentile(0.50),
+            'p95': percentile(0.95),
+            'p99': percentile(0.99),
+            'max': round(latencies[-1] * 1000, 3) if latencies else 0.0,
+        }
+        return snapshot
+
+
+class LabelRequestHandler(BaseHTTPRequestHandler):
+    """渲染服务的HTTP接口
+
+    GET  /render?字段=值        渲染单个标签，返回PNG
+    POST /render  {"字段": 值}  同上
+    POST /batch   {"rows": [...], "format": "zip" | "pdf"}  批量渲染
+    单个和批量渲染都可用 _format / format 指定热敏打印格式（zpl、zpl-native、epl、escpos），
+    返回打印机指令流；指定 svg 时单个标签返回SVG，批量返回拼在一个文档中的SVG
+    GET  /metrics               延迟和吞吐统计
+    GET  /health                健康检查
+    """
+
+    server_version = "LabelRenderServer/1.0"
+    # 已发送响应头后出错时不能再发送错误响应
+    response_started = False
+
+    @property
+    def label_server(self):
+        return self.server.label_server
+    
+    def send_response(self, code, message=None):
+        self.response_started = True
+        super().send_response(code, message)
+    
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path == "/health":
+            self._send_json(200, {'status': 'ok'})
+        elif url.path == "/metrics":
+            self._send_json(200, self.label_server.metrics.snapshot())
+        elif url.path == "/render":
+            self._handle(self._render_single, dict(parse_qsl(url.query)))
+        else:
+            self._send_json(404, {'error': f"未知路径: {url.path}"})
+    
+    def do_POST(self):
+        url = urlparse(self.path)
+        if url.path not in ("/render", "/batch"):
+            self._send_json(404, {'error': f"未知路径: {url.path}"})
+            return
+        
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            payload = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError as e:
+            self._send_json(400, {'error': f"请求体不是有效的JSON: {str(e)}"})
+            return
+        
+        if url.path == "/render":
+            self._handle(self._render_single, payload)
+        else:
+            self._handle(self._render_batch, payload)
+    
+    def _handle(self, func, payload):
+        """占用一个并发名额后处理请求，名额用尽时直接返回503"""
+        server = self.label_server
+        if not server.slots.acquire(blocking=False):
+            server.metrics.reject()
+            self._send_json(503, {'error': "渲染服务繁忙，请稍后重试"}, {'Retry-After': "1"})
+            return
+        
+        server.metrics.begin()
+        start = time.perf_counter()
+        labels, error = 0, False
+        self.response_started = False
+        try:
+            labels = func(payload)
+        except (ValueError, TypeError, KeyError) as e:
+            error = True
+            self._send_error(400, e)
+        except Exception as e:
+            error = True
+            self._send_error(500, e)
+        finally:
+            server.metrics.end(time.perf_counter() - start, labels, error)
+            server.slots.release()
+    
+    def _render_single(self, row):
+        if not isinstance(row, dict):
+            raise ValueError("请求体必须是字段名到内容的JSON对象")
+        output_format = row.pop('_format', "png")
+        data = self.label_server.submit(row, output_format).result()
+        self.send_response(200)
+        self.send_header('Content-Type', CONTENT_TYPES.get(output_format, "application/octet-stream"))
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+        return 1
+    
+    def _render_batch(self, payload):
+        rows = payload.get('rows') if isinstance(payload, dict) else None
+        if not isinstance(rows, list) or not all(isinstance(row, dict) for row in rows):
+            raise ValueError("rows 必须是JSON对象数组")
+        if len(rows) > self.label_server.max_batch:
+            raise ValueError(f"单次最多渲染 {self.label_server.max_batch} 个标签")
+        
+        output_format = payload.get('format', "zip")
+        if output_format == "zip":
+            # 边渲染边写出ZIP，不在内存中保留整批结果
+            self.send_response(200)
+            self.send_header('Content-Type', "application/zip")
+            self.send_header('Content-Disposition', 'attachment; filename="labels.zip"')
+            self.send_header('Connection', "close")
+            self.end_headers()
+            self.close_connection = True
+            with zipfile.ZipFile(self.wfile, "w", zipfile.ZIP_STORED) as zf:
+                for idx, data in enumerate(self.label_server.render_many(rows)):
+                    zf.writestr(f"label_{idx+1}.png", data)
+        elif output_format in SVG_FORMATS:
+            # 文档头中的尺寸只依赖标签数量，可以边渲染边写出；
+            # 布局和路径在线程池中计算，这里只按顺序分配二维码路径编号
+            encoder = self.label_server.encoder("svg-sheet")
+            self.send_response(200)
+            self.send_header('Content-Type', CONTENT_TYPES["svg"])
+            self.send_header('Connection', "close")
+            self.end_headers()
+            self.close_connection = True
+            for chunk in encoder.iter_document(self.label_server.render_many(rows, encoder.prepare), len(rows)):
+                self.wfile.write(chunk.encode("utf-8"))
+        elif output_format in THERMAL_FORMATS:
+            # 打印指令可以直接拼接，逐个标签写出
+            encoder = self.label_server.encoder(output_format)
+            self.send_response(200)
+            self.send_header('Content-Type', "application/octet-stream")
+            self.send_header('Connection', "close")
+            self.end_headers()
+            self.close_connection = True
+            for data in self.label_server.render_many(rows, encoder.encode):
+                self.wfile.write(data)
+        elif output_format == "pdf":
+            # 页面在线程池中渲染并压缩，逐页写出，交叉引用表最后写出
+            if not rows:
+                raise ValueError("rows 不能为空")
+            renderer = self.label_server.renderer
+            self.send_response(200)
+            self.send_header('Content-Type', "application/pdf")
+            self.send_header('Connection', "close")
+            self.end_headers()
+            self.close_connection = True
+            writer = PdfStreamWriter(self.wfile)
+            for page in self.label_server.render_many(rows, lambda row: pdf_page_data(renderer.render(row))):
+                writer.add_page(*page)
+            writer.close()
+        else:
+            raise ValueError(f"不支持的输出格式: {output_format}")
+        return len(rows)
+    
+    def _send_error(self, status, error):
+        if not self.response_started:
+            self._send_json(status, {'error': str(error)})
+            return
+        # 流式响应已经开始，只能记录错误并断开连接，客户端会收到不完整的内容
+        self.log_error("响应发送过程中出错: %s", error)
+        self.close_connection = True
+    
+    def _send_json(self, status, obj, headers=None):
+        data = json.dumps(obj, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header('Content-Type', "application/json; charset=utf-8")
+        self.send_header('Content-Length', str(len(data)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+
+class LabelRenderServer:
+    """本地HTTP标签渲染服务，渲染器常驻内存，渲染任务在固定大小的线程池中排队执行"""
+
+    def __init__(self, config, host="127.0.0.1", port=8000, workers=4, max_queue=32, max_batch=5000):
+        self.config = config
+        self.renderer = get_renderer(config)
+        self._encoders = {}
+        self.pool = self.renderer.canvas_pool(workers)
+        self.workers = workers
+        self.max_batch = max_batch
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="label-render")
+        # 同时处理和排队的请求数上限
+        self.slots = threading.BoundedSemaphore(workers + max_queue)
+        self.metrics = ServerMetrics()
+        self.httpd = ThreadingHTTPServer((host, port), LabelRequestHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.label_server = self
+    
+    @property
+    def address(self):
+        return self.httpd.server_address[:2]
+    
+    def encoder(self, output_format):
+        encoder = self._encoders.get(output_format)
+        if encoder is None:
+            encoder = encoder_from_config(self.renderer, self.config, output_format)
+            self._encoders[output_format] = encoder
+        return encoder
+    
+    def submit(self, row, output_format="png"):
+        if output_format == "png":
+            return self.executor.submit(self.renderer.render_png, row, self.pool)
+        return self.executor.submit(self.encoder(output_format).encode, row)
+    
+    def render_many(self, rows, func=None):
+        """按输入顺序产出渲染结果，同时在线程池中的任务不超过 workers 的两倍"""
+        func = func or (lambda row: self.renderer.render_png(row, self.pool))
+        pending = deque()
+        for row in rows:
+            pending.append(self.executor.submit(func, row))
+            if len(pending) >= self.workers * 2:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+    
+    def serve_forever(self):
+        self.httpd.serve_forever()
+    
+    def shutdown(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        self.executor.shutdown(wait=False)
+
+
+def run_batch(args):
+    config = read_config_file(args.config)
+    
+    def report(job):
+        if job.status == JOB_DONE:
+            print(f"[{job.status}] {job.input_path}: {job.total} 个标签, {job.seconds:.1f} 秒, "
+                  f"{job.labels_per_second:.1f} 个/秒 -> {job.output}"
+                  + (f", 校验问题 {job.verify_issues} 个" if job.verify_issues else ""))
+        else:
+            print(f"[{job.status}] {job.input_path}: {job.error}")
+        sys.stdout.flush()
+    
+    scheduler = JobScheduler(max_jobs=args.jobs)
+    try:
+        for input_path in args.batch or []:
+            scheduler.submit(input_path, paired_config(input_path, config), args.output, on_finish=report)
+        if args.job_list:
+            for input_path, job_config, output_dir, priority in read_job_list(args.job_list, config):
+                scheduler.submit(input_path, job_config, output_dir or args.output, priority, on_finish=report)
+        
+        if args.watch:
+            scheduler.watch(args.watch, config, args.output, on_finish=report)
+            print(f"正在监视目录: {args.watch}", flush=True)
+            while True:
+                time.sleep(60)
+        
+        scheduler.join()
+        print(json.dumps(scheduler.summary(), ensure_ascii=False))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        # 退出前等待进程池关闭，避免解释器退出时进程池仍在唤醒工作进程
+        scheduler.shutdown(wait=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="高级标签生成器")
+    parser.add_argument("--serve", action="store_true", help="以本地HTTP渲染服务方式运行，不启动界面")
+    parser.add_argument("--config", default=CONFIG_FILE, help="标签配置文件")
+    parser.add_argument("--host", default="127.0.0.1", help="服务监听地址")
+    parser.add_argument("--port", type=int, default=8000, help="服务监听端口")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 4, help="渲染线程数")
+    parser.add_argument("--max-queue", type=int, default=32, help="排队等待的最大请求数")
+    parser.add_argument("--batch", nargs="+", metavar="FILE", help="无界面批量处理这些数据文件")
+    parser.add_argument("--job-list", help="JSON任务清单，每项包含 input、config、output、priority")
+    parser.add_argument("--watch", metavar="DIR", help="监视目录并自动处理新出现的数据文件")
+    parser.add_argument("--output", help="批量任务的输出目录，默认使用配置中的输出目录")
+    parser.add_argument("--jobs", type=int, default=2, help="同时运行的批量任务数")
+    args = parser.parse_args(argv)
+    
+    if args.batch or args.job_list or args.watch:
+        run_batch(args)
+        return
+    
+    if args.serve:
+        server = LabelRenderServer(read_config_file(args.config), host=args.host, port=args.port,
+                                   workers=args.workers, max_queue=args.max_queue)
+        host, port = server.address
+        print(f"标签渲染服务已启动: http://{host}:{port}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.shutdown()
+        return
+    
     root = tk.Tk()
     app = LabelGeneratorApp(root)
-    root.mainloop()
\ No newline at end of file
+    root.mainloop()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+from qr_generator import (CONFIG_VERSION, config_from_document, config_to_document, migrate_config,
+                          read_config_file, validate_document, write_config_file)
+
+
+V1_CONFIG = {
+    'label_width': 300,
+    'label_height': 400,
+    'qr_size': 150,
+    'text_color': "#112233",
+    'field_order': ["编号", "名称", "备注"],
+    'field_display_types': {"编号": "qrcode", "名称": "text", "备注": "text"},
+    'field_prefixes': {"编号": "ID-"},
+    'field_suffixes': {},
+    'field_font_sizes': {"名称": "20"},
+    'field_colors': {"名称": "#FF0000"},
+    'custom_fields': {"备注": "测试"},
+}
+
+
+@pytest.mark.parametrize("data", [V1_CONFIG, dict(V1_CONFIG, version=1)])
+def test_migrate_v1(data):
+    document = migrate_config(data)
+    
+    assert document['version'] == CONFIG_VERSION
+    assert document['label'] == {'width': 300, 'height': 400, 'qr_size': 150, 'text_color': "#112233"}
+    assert document['fields'] == [
+        {'name': "编号", 'display': "qrcode", 'prefix': "ID-", 'suffix': "", 'font_size': 16},
+        {'name': "名称", 'display': "text", 'prefix': "", 'suffix': "", 'font_size': 20, 'color': "#FF0000"},
+        {'name': "备注", 'display': "text", 'prefix': "", 'suffix': "", 'font_size': 16, 'custom': "测试"},
+    ]
+
+
+def test_migrate_rejects_unknown_versions():
+    with pytest.raises(ValueError):
+        migrate_config({'version': CONFIG_VERSION + 1})
+    with pytest.raises(ValueError):
+        migrate_config({'version': "2"})
+
+
+def test_round_trip(tmp_path):
+    path = str(tmp_path / "label_config.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(V1_CONFIG, f, ensure_ascii=False)
+    
+    config = read_config_file(path)
+    assert config['field_font_sizes'] == {"编号": 16, "名称": 20, "备注": 16}
+    # 未单独设置颜色的字段不写入颜色
+    assert config['field_colors'] == {"名称": "#FF0000"}
+    
+    config.update(printer_dpi=300, label_width_mm="50", memory_limit_mb=256, verify_enabled=True,
+                  verify_sample_rate=0.1)
+    write_config_file(config, path)
+    assert read_config_file(path) == config
+    assert config_from_document(config_to_document(config)) == config
+
+
+@pytest.mark.parametrize("document, problem", [
+    ({'label': {'width': "x"}}, "label.width 必须是正整数"),
+    ({'label': {'bg_color': "#GGGGGG"}}, "label.bg_color 不是有效的颜色: #GGGGGG"),
+    ({'label': []}, "label 必须是JSON对象"),
+    ({'output': {'format': "bmp"}}, "output.format 不支持: bmp"),
+    ({'output': {'printer_dpi': "abc"}}, "output.printer_dpi 必须是正整数"),
+    ({'output': {'svg_columns': 0}}, "output.svg_columns 必须是正整数"),
+    ({'output': {'memory_limit_mb': -1}}, "output.memory_limit_mb 必须是非负整数"),
+    ({'output': {'width_mm': "abc"}}, "output.width_mm 必须是正数或留空"),
+    ({'output': {'height_mm': -5}}, "output.height_mm 必须是正数或留空"),
+    ({'verify': {'enabled': "yes"}}, "verify.enabled 必须是 true 或 false"),
+    ({'verify': {'sample_rate': "x"}}, "verify.sample_rate 必须是 0 到 1 之间的数"),
+    ({'verify': {'sample_rate': 2}}, "verify.sample_rate 必须是 0 到 1 之间的数"),
+    ({'verify': {'min_module_px': 0}}, "verify.min_module_px 必须是正数"),
+    ({'verify': {'min_contrast': 30}}, "verify.min_contrast 必须是 1 到 21 之间的数"),
+    ({'fields': [{'name': "a"}, {'name': "a"}]}, "fields[1]（a） 字段名重复"),
+    ({'fields': [{'name': "a", 'display': "barcode"}]}, "fields[0]（a） display 必须是 text 或 qrcode"),
+])
+def test_validation_messages(document, problem):
+    document = dict(document, version=CONFIG_VERSION)
+    assert problem in validate_document(document)
+    with pytest.raises(ValueError, match=r"配置无效"):
+        config_from_document(document)
+
+
+def test_valid_document_has_no_problems():
+    document = config_to_document(dict(V1_CONFIG, field_font_sizes={"名称": 20}, printer_dpi=203,
+                                       label_width_mm="", label_height_mm="30", svg_columns=2,
+                                       printer_target="tcp://192.168.1.50:9100", memory_limit_mb=0,
+                                       verify_enabled=False, verify_sample_rate=0.01,
+                                       verify_min_module_px=3, verify_min_contrast=3.0))
+    assert validate_document(document) == []
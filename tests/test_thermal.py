@@ -0,0 +1,48 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+from qr_generator import LabelRenderer, PrinterOutput, ThermalEncoder, parse_printer_address, zpl_field_data
+
+
+def make_renderer():
+    return LabelRenderer({
+        'field_order': ['code'],
+        'field_display_types': {'code': "qrcode"},
+    })
+
+
+def test_zpl_field_data_escapes_control_characters():
+    assert zpl_field_data("A^FS^XZ~JA_1") == "A_5EFS_5EXZ_7EJA_5F1"
+
+
+def test_zpl_native_does_not_inject_commands():
+    encoder = ThermalEncoder(make_renderer(), "zpl-native")
+    data = encoder.encode({'code': "A^FS^XZ~JA"}).decode("utf-8")
+    
+    assert "^FH_^FDMA,A_5EFS_5EXZ_7EJA^FS" in data
+    assert "~JA" not in data
+    assert data.count("^XZ") == 1
+    assert data.rstrip().endswith("^XZ")
+
+
+def test_zpl_native_escapes_underscore():
+    encoder = ThermalEncoder(make_renderer(), "zpl-native")
+    data = encoder.encode({'code': "a_5E"}).decode("utf-8")
+    
+    assert "^FDMA,a_5F5E^FS" in data
+
+
+def test_parse_printer_address():
+    assert parse_printer_address("tcp://192.168.1.50:9100") == ("192.168.1.50", 9100)
+    assert parse_printer_address("tcp://[::1]:9100") == ("::1", 9100)
+
+
+@pytest.mark.parametrize("target", ["tcp://printer", "tcp://:9100", "tcp://printer:port"])
+def test_printer_output_rejects_bad_address(target):
+    with pytest.raises(ValueError):
+        with PrinterOutput(target):
+            pass
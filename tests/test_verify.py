@@ -0,0 +1,114 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+import qrcode
+
+from qr_generator import LabelRenderer, LabelVerifier, ThermalEncoder, decode_qr_matrix, sample_qr_modules
+
+ERROR_LEVELS = {
+    "L": qrcode.constants.ERROR_CORRECT_L,
+    "M": qrcode.constants.ERROR_CORRECT_M,
+    "Q": qrcode.constants.ERROR_CORRECT_Q,
+    "H": qrcode.constants.ERROR_CORRECT_H,
+}
+
+
+def qr_modules(content, level="M", version=None):
+    qr = qrcode.QRCode(version=version, error_correction=ERROR_LEVELS[level], border=0)
+    qr.add_data(content)
+    qr.make(fit=version is None)
+    return qr.version, qr.get_matrix()
+
+
+@pytest.mark.parametrize("content", [
+    "0123456789" * 3,                  # 数字
+    "HELLO WORLD $%*+-./:",            # 字母数字
+    "label-42?x=a&y=b",                # 字节
+    "标签测试：编号ID-0001",             # UTF-8
+    "ABCDEF0123456789012345678901xyz",  # 混合模式分段
+])
+def test_decode_modes(content):
+    _, modules = qr_modules(content)
+    assert decode_qr_matrix(modules).decode("utf-8") == content
+
+
+@pytest.mark.parametrize("level", sorted(ERROR_LEVELS))
+@pytest.mark.parametrize("length", [100, 400, 1000])
+def test_decode_large_versions_and_blocks(level, length):
+    # 版本7以上带版本信息，较长内容分为多个纠错块并交错排列
+    content = "".join(chr(0x41 + (i * 7) % 26) + str(i % 10) for i in range(length // 2)).lower()
+    version, modules = qr_modules(content, level)
+    if length >= 400:
+        assert version >= 7
+    assert decode_qr_matrix(modules).decode("utf-8") == content
+
+
+def test_decode_fixed_version_with_padding():
+    version, modules = qr_modules("short", "H", version=10)
+    assert version == 10
+    assert decode_qr_matrix(modules) == b"short"
+
+
+def test_decode_rejects_invalid_size():
+    with pytest.raises(ValueError):
+        decode_qr_matrix([[False] * 20 for _ in range(20)])
+
+
+def make_renderer(**config):
+    return LabelRenderer(dict({
+        'qr_size': 200,
+        'label_height': 300,
+        'field_order': ['code'],
+        'field_display_types': {'code': "qrcode"},
+    }, **config))
+
+
+def test_decode_rendered_label():
+    renderer = make_renderer()
+    row = {'code': "ID-0001 标签"}
+    element = renderer.layout(row)[0]
+    modules = len(renderer.get_qr_matrix(element.content))
+    img = renderer.render(row)
+    assert decode_qr_matrix(sample_qr_modules(img, element.x, element.y, element.size, modules)) \
+        == "ID-0001 标签".encode("utf-8")
+
+
+def test_verifier_reports_duplicates():
+    verifier = LabelVerifier(make_renderer(), sample_rate=1)
+    for idx, code in enumerate(["A", "B", "A", "C", "B"]):
+        verifier.check(idx, {'code': code})
+    issues = verifier.finish()
+    
+    assert [issue for issue in issues if issue[2] == "内容重复"] == [
+        (3, 'code', "内容重复", "与第 1 行相同: A"),
+        (5, 'code', "内容重复", "与第 2 行相同: B"),
+    ]
+    assert verifier.decoded == 5
+    assert not [issue for issue in issues if issue[2] != "内容重复"]
+
+
+def test_verifier_reports_low_contrast():
+    verifier = LabelVerifier(make_renderer(qr_color="#DDDDDD"), min_contrast=3.0)
+    issues = verifier.finish()
+    
+    assert len(issues) == 1
+    assert issues[0][:3] == (0, "", "对比度不足")
+
+
+def test_verifier_skips_decoding_native_zpl(tmp_path):
+    renderer = make_renderer()
+    verifier = LabelVerifier(renderer, ThermalEncoder(renderer, "zpl-native"), sample_rate=1)
+    verifier.check(0, {'code': "A"})
+    issues = verifier.finish()
+    
+    assert issues == []
+    assert verifier.decoded == 0
+    assert verifier.notes[0][2] == "未解码"
+    
+    path = str(tmp_path / "report.csv")
+    verifier.write_report(path)
+    with open(path, encoding="utf-8-sig") as f:
+        assert "未解码" in f.read()